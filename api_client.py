@@ -5,32 +5,117 @@ Functions for interacting with the OpenRouter API.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import atexit
 import base64
+import copy
+import functools
+import hashlib
 import json
+import mimetypes
+import os
+import time
 import sys # Import the sys module
+# orjson is optional (pip install openrouter-client[fast]); it serializes large
+# request bodies, e.g. base64 images, several times faster than the stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 # Handle both package import and direct script execution
 try:
     from openrouter.utils import extract_text_from_pdf
 except ImportError:
     from utils import extract_text_from_pdf
 
-def call_openrouter_api(api_key, base_url, model, messages, config_options=None):
+# Connection pool sizing shared by the sync and async clients. Requests to a
+# single host beyond the pool size would otherwise queue or reconnect, so the
+# limit is sized for batch callers running many requests concurrently.
+# (urllib3 and aiohttp both already set TCP_NODELAY on their sockets.)
+_POOL_MAXSIZE = 100
+
+# Transient failures (rate limits, gateway errors) are retried with exponential
+# backoff so one 429/503 doesn't fail a whole multi-step workflow. 429 and 503,
+# like failures to connect, mean the request was not processed. 500, 502 and 504
+# give no such guarantee: a gateway error can arrive after the upstream completion
+# ran and was billed, so retrying them can double-bill. A read timeout or dropped
+# connection after the request was sent is not retried at all.
+_RETRY_TOTAL = 5
+_RETRY_BACKOFF_FACTOR = 0.5
+_RETRY_BACKOFF_MAX = 30
+_RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+class _CappedRetry(Retry):
+    """Retry that waits at most _RETRY_BACKOFF_MAX seconds for a Retry-After header, like the async path."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, _RETRY_BACKOFF_MAX)
+
+# Shared session so repeated API calls reuse pooled keep-alive connections
+# instead of paying a fresh TCP+TLS handshake on every request.
+_SESSION = requests.Session()
+_SESSION.headers.update({"Content-Type": "application/json"})
+_ADAPTER = HTTPAdapter(
+    pool_connections=10,        # Number of distinct hosts to keep pools for
+    pool_maxsize=_POOL_MAXSIZE, # Connections kept per host
+    pool_block=False,           # Open extra connections rather than wait when the pool is busy
+    max_retries=_CappedRetry(
+        total=_RETRY_TOTAL,
+        read=0,                    # Never re-send after the request went out (see above)
+        other=0,
+        backoff_factor=_RETRY_BACKOFF_FACTOR,
+        status_forcelist=_RETRY_STATUSES,
+        allowed_methods=["POST"],  # urllib3 skips POST by default; 500/502/504 re-sends can double-bill (see above)
+        respect_retry_after_header=True,
+        raise_on_status=False      # Hand the final response to raise_for_status()
+    )
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER) # e.g. a local proxy set as BASE_URL
+
+def _json_dumps(obj):
+    """Serialize obj to a UTF-8 JSON request body."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+def _json_loads(data):
+    """Parse a JSON response body (bytes or str)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def close_session():
     """
-    Call the OpenRouter API with the given parameters
-    
+    Close the shared HTTP session and release its pooled connections.
+    """
+    _SESSION.close()
+
+# Release the pooled keep-alive sockets cleanly when the interpreter exits
+atexit.register(close_session)
+
+def _build_request(api_key, base_url, model, messages, config_options=None):
+    """
+    Build the URL, headers and JSON body for a chat completions request
+
     Args:
         api_key (str): The API key for authentication
         base_url (str): The base URL for the API
         model (str): The model to use
         messages (list): The messages to send to the API
         config_options (dict, optional): Additional configuration options
-        
+
     Returns:
-        dict: The API response
+        tuple: (api_url, headers, request_body)
     """
+    # Content-Type is set once on the shared session; only the key varies per config
     headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
+        "Authorization": f"Bearer {api_key}"
     }
     
     # Default request body
@@ -45,163 +130,456 @@ def call_openrouter_api(api_key, base_url, model, messages, config_options=None)
         for key, value in config_options.items():
             if value is not None:
                 request_body[key] = value
+
+    # Ensure the URL is properly formatted
+    api_url = f"{base_url}/api/v1/chat/completions"
+    if base_url.endswith('/'):
+        api_url = f"{base_url}api/v1/chat/completions"
+
+    return api_url, headers, request_body
+
+# --- Response Cache ---
+# Deterministic (temperature == 0) requests are cached on disk keyed by a hash
+# of the request, so repeated runs skip the network call entirely.
+# OPENROUTER_CACHE=off disables it, OPENROUTER_CACHE_DIR moves it and
+# OPENROUTER_CACHE_TTL sets the entry lifetime in seconds (default 7 days).
+
+_CACHE_DIR = os.path.expanduser(os.getenv("OPENROUTER_CACHE_DIR", "~/.cache/openrouter"))
+_CACHE_TTL = float(os.getenv("OPENROUTER_CACHE_TTL", 7 * 24 * 3600))
+
+def _cache_enabled(config_options):
+    """Return True if a request with these options may be served from cache."""
+    if os.getenv("OPENROUTER_CACHE", "on").lower() in ("off", "0", "false", "no"):
+        return False
+    return bool(config_options) and config_options.get("temperature") == 0
+
+def _cache_key(base_url, model, messages, config_options):
+    """
+    Hash the parts of a request that determine its response
+
+    Args:
+        base_url (str): The base URL for the API (a different endpoint may answer differently)
+        model (str): The model to use
+        messages (list): The messages sent to the API
+        config_options (dict): Additional configuration options
+
+    Returns:
+        str: Hex SHA-256 digest of the canonicalized request
+    """
+    canonical = json.dumps({
+        "u": base_url.rstrip("/"),
+        "m": model,
+        "msgs": messages,
+        "t": config_options.get("temperature"),
+        "p": config_options.get("top_p"),
+        "rf": config_options.get("response_format"),
+        "pv": config_options.get("provider") # Provider order/only/ignore pick who answers
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _cache_get(key):
+    """Return the cached response for key, or None on miss/expiry."""
+    path = os.path.join(_CACHE_DIR, key + ".json")
+    try:
+        if time.time() - os.path.getmtime(path) > _CACHE_TTL:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _cache_put(key, response):
+    """Store a successful response under key; failures are ignored."""
+    path = os.path.join(_CACHE_DIR, key + ".json")
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(response, f)
+        os.replace(tmp_path, path) # Atomic so concurrent readers never see a partial file
+    except (OSError, TypeError) as e:
+        print(f"Warning: Could not write response cache entry: {e}", file=sys.stderr)
+
+def call_openrouter_api(api_key, base_url, model, messages, config_options=None):
+    """
+    Call the OpenRouter API with the given parameters
+    
+    Args:
+        api_key (str): The API key for authentication
+        base_url (str): The base URL for the API
+        model (str): The model to use
+        messages (list): The messages to send to the API
+        config_options (dict, optional): Additional configuration options
+        
+    Returns:
+        dict: The API response
+    """
+    cache_key = None
+    if _cache_enabled(config_options):
+        cache_key = _cache_key(base_url, model, messages, config_options)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+    api_url, headers, request_body = _build_request(api_key, base_url, model, messages, config_options)
     
     # Make the API request
     try:
-        # Ensure the URL is properly formatted
-        api_url = f"{base_url}/api/v1/chat/completions"
-        if base_url.endswith('/'):
-            api_url = f"{base_url}api/v1/chat/completions"
-            
-        response = requests.post(
+        response = _SESSION.post(
             api_url,
             headers=headers,
-            json=request_body,
+            data=_json_dumps(request_body),
             timeout=60
         )
         response.raise_for_status()
-        return response.json()
+        result = _json_loads(response.content)
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
+    except ValueError as e: # Response body was not valid JSON
+        return {"error": f"Invalid JSON in API response: {e}"}
+
+    if cache_key and "error" not in result:
+        _cache_put(cache_key, result)
+    return result
+
+# --- Async API ---
+# aiohttp is an optional dependency (pip install openrouter-client[async]);
+# it is only imported when one of the a* functions is first used.
 
-def process_text(text_file, config):
+_ASYNC_SESSIONS = {} # event loop -> (aiohttp session, generator that closes it)
+
+async def _close_at_loop_shutdown(loop, session):
     """
-    Process a text file through the OpenRouter API
+    Async generator left suspended for the life of loop. The loop's
+    shutdown_asyncgens() (which asyncio.run calls on exit) resumes it, so the
+    session is closed while its loop can still close the sockets.
+    """
+    try:
+        yield
+    finally:
+        _ASYNC_SESSIONS.pop(loop, None)
+        await session.close()
+
+async def _get_async_session():
+    """
+    Return the shared aiohttp session for the running event loop, creating it
+    on first use. Each loop gets its own session, closed when the loop shuts down.
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    entry = _ASYNC_SESSIONS.get(loop)
+    if entry is None or entry[0].closed:
+        session = aiohttp.ClientSession(
+            # DNS answers are cached for 5 minutes so batches don't re-resolve per request
+            connector=aiohttp.TCPConnector(limit=_POOL_MAXSIZE, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=60),
+            headers={"Content-Type": "application/json"}
+        )
+        closer = _close_at_loop_shutdown(loop, session)
+        await closer.asend(None) # Started on this loop, so the loop tracks it
+        entry = _ASYNC_SESSIONS[loop] = (session, closer)
+    return entry[0]
+
+async def aclose_session():
+    """
+    Close the running event loop's aiohttp session, if one has been opened.
+    asyncio.run closes it on exit as well.
+    """
+    entry = _ASYNC_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+def _retry_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number attempt + 1, honouring a Retry-After
+    header (in seconds) when the server sends one.
+    """
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), _RETRY_BACKOFF_MAX)
+        except ValueError:
+            pass # HTTP-date form; fall back to exponential backoff
+    return min(_RETRY_BACKOFF_FACTOR * (2 ** attempt), _RETRY_BACKOFF_MAX)
+
+async def acall_openrouter_api(api_key, base_url, model, messages, config_options=None):
+    """
+    Async variant of call_openrouter_api built on aiohttp
     
     Args:
-        text_file (str): Path to the text file
-        config (dict): Configuration parameters
+        api_key (str): The API key for authentication
+        base_url (str): The base URL for the API
+        model (str): The model to use
+        messages (list): The messages to send to the API
+        config_options (dict, optional): Additional configuration options
         
     Returns:
         dict: The API response
     """
-    # Read the text file
-    with open(text_file, "r", encoding="utf-8") as f:
-        text_content = f.read()
-    
-    # Prepare messages
+    import aiohttp
+
+    cache_key = None
+    if _cache_enabled(config_options):
+        cache_key = _cache_key(base_url, model, messages, config_options)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+    api_url, headers, request_body = _build_request(api_key, base_url, model, messages, config_options)
+    body = _json_dumps(request_body)
+    session = await _get_async_session()
+    # Same retry policy as the urllib3 Retry mounted on the sync session
+    for attempt in range(_RETRY_TOTAL + 1):
+        try:
+            async with session.post(api_url, headers=headers, data=body) as response:
+                if response.status in _RETRY_STATUSES and attempt < _RETRY_TOTAL:
+                    await asyncio.sleep(_retry_delay(attempt, response.headers.get("Retry-After")))
+                    continue
+                response.raise_for_status()
+                result = _json_loads(await response.read())
+                break
+        except aiohttp.ClientConnectorError as e: # Could not connect, so nothing was sent
+            if attempt < _RETRY_TOTAL:
+                await asyncio.sleep(_retry_delay(attempt))
+                continue
+            return {"error": str(e) or type(e).__name__}
+        except asyncio.TimeoutError as e:
+            return {"error": str(e) or "Request timed out"}
+        except aiohttp.ClientError as e:
+            return {"error": str(e) or type(e).__name__}
+        except ValueError as e: # Response body was not valid JSON
+            return {"error": f"Invalid JSON in API response: {e}"}
+
+    if cache_key and "error" not in result:
+        _cache_put(cache_key, result)
+    return result
+
+# --- Request assembly shared by the sync and async process_* functions ---
+
+def prepare_config(config):
+    """
+    Build the optional request parameters from a loaded configuration.
+    Callers processing many inputs with one config can call this once and
+    pass the result as prepared= to the process_* functions.
+
+    Args:
+        config (dict): Configuration parameters
+
+    Returns:
+        dict: Options to pass as config_options to call_openrouter_api
+    """
+    return {
+        "temperature": float(config.get("TEMPERATURE", 0.7)),
+        "top_p": float(config.get("TOP_P", 1.0)),
+        "stream": config.get("STREAM", "false").lower() == "true",
+        "response_format": _parse_json_config_value(config.get("RESPONSE_FORMAT"), default={"type": "text"}),
+        "provider": _parse_json_config_value(config.get("PROVIDER"), default={"data_collection": "deny"}),
+    }
+
+# Messages are laid out as [system, instructions, document] so that the system
+# prompt and USER_PROMPT form a byte-identical prefix across calls with the same
+# config. Providers that support prompt caching can then reuse that prefix.
+
+def _is_anthropic_model(config):
+    """Anthropic models need explicit cache_control breakpoints; others cache automatically."""
+    return config.get("MODEL", "").startswith("anthropic/")
+
+def _prompt_content(text, cacheable):
+    """Return message content for a stable prompt, marked as a cache breakpoint if requested."""
+    if not cacheable:
+        return text
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+def _build_prefix_messages(config, default_user_prompt=""):
+    """
+    Build the stable system + instruction messages shared by all inputs for a config
+    """
+    cacheable = _is_anthropic_model(config)
     messages = [
         {
             "role": "system",
-            "content": config.get("SYSTEM_PROMPT", "You are a helpful assistant.")
-        },
-        {
-            "role": "user",
-            "content": config.get("USER_PROMPT", "") + "\n\n" + text_content if config.get("USER_PROMPT") else text_content
+            "content": _prompt_content(config.get("SYSTEM_PROMPT", "You are a helpful assistant."), cacheable)
         }
     ]
+    user_prompt = config.get("USER_PROMPT", default_user_prompt)
+    if user_prompt:
+        messages.append({
+            "role": "user",
+            "content": _prompt_content(user_prompt, cacheable)
+        })
+    return messages
+
+def _build_text_messages(text_content, config):
+    """
+    Build the message list for a text (or extracted PDF text) request
+    """
+    messages = _build_prefix_messages(config)
+    messages.append({
+        "role": "user",
+        "content": text_content
+    })
+    return messages
+
+def _detect_image_mime(image_path):
+    """Guess the image MIME type from the file extension, defaulting to JPEG."""
+    mime_type, _ = mimetypes.guess_type(image_path)
+    if mime_type and mime_type.startswith("image/"):
+        return mime_type
+    return "image/jpeg"
+
+def _build_image_messages(image_path, config):
+    """
+    Build the message list for an image request, inlining local files as base64
+    """
+    # For local files, read and encode as base64
+    if image_path.startswith(('http://', 'https://')):
+        # For remote URLs, pass the URL directly
+        image_content = image_path
+    else:
+        # For local files, read and encode as base64. The data URL is assembled
+        # as bytes and decoded once, avoiding an extra full-size str copy.
+        with open(image_path, 'rb') as image_file:
+            image_data = image_file.read()
+        encoded = base64.b64encode(image_data)
+        del image_data
+        image_content = b"".join((b"data:", _detect_image_mime(image_path).encode("ascii"), b";base64,", encoded)).decode("ascii")
+        del encoded
     
-    # Call the API
+    # Prepare messages with image content
+    messages = _build_prefix_messages(config, default_user_prompt="Describe this image in detail.")
+    messages.append({
+        "role": "user",
+        "content": [
+            {
+                "type": "image_url",
+                "image_url": {"url": image_content}
+            }
+        ]
+    })
+    return messages
+
+def _read_text_file(text_file):
+    """Read a UTF-8 text input file."""
+    with open(text_file, "r", encoding="utf-8") as f:
+        return f.read()
+
+def process_text(text_file, config, prepared=None):
+    """
+    Process a text file through the OpenRouter API
+    
+    Args:
+        text_file (str): Path to the text file
+        config (dict): Configuration parameters
+        prepared (dict, optional): Options from prepare_config(config), to skip rebuilding them
+        
+    Returns:
+        dict: The API response
+    """
+    return process_text_content(_read_text_file(text_file), config, prepared)
+
+def process_text_content(text_content, config, prepared=None):
+    """
+    Process in-memory text through the OpenRouter API
+    
+    Args:
+        text_content (str): The text to send
+        config (dict): Configuration parameters
+        prepared (dict, optional): Options from prepare_config(config), to skip rebuilding them
+        
+    Returns:
+        dict: The API response
+    """
+    messages = _build_text_messages(text_content, config)
     return call_openrouter_api(
         config["API_KEY"],
         config["BASE_URL"],
         config["MODEL"],
         messages,
-        {
-            "temperature": float(config.get("TEMPERATURE", 0.7)),
-            "top_p": float(config.get("TOP_P", 1.0)),
-            "stream": config.get("STREAM", "false").lower() == "true",
-            "response_format": _parse_json_config_value(config.get("RESPONSE_FORMAT"), default={"type": "text"}),
-            "provider": _parse_json_config_value(config.get("PROVIDER"), default={"data_collection": "deny"}),
-        }
+        prepared if prepared is not None else prepare_config(config)
     )
 
-def process_pdf(pdf_path, config):
+def process_pdf(pdf_path, config, prepared=None):
     """
     Process a PDF file through the OpenRouter API
     
     Args:
         pdf_path (str): Path to the PDF file or URL
         config (dict): Configuration parameters
+        prepared (dict, optional): Options from prepare_config(config), to skip rebuilding them
         
     Returns:
         dict: The API response
     """
-    # Extract text from the PDF
-    pdf_text = extract_text_from_pdf(pdf_path)
-    
-    # Prepare messages
-    messages = [
-        {
-            "role": "system",
-            "content": config.get("SYSTEM_PROMPT", "You are a helpful assistant.")
-        },
-        {
-            "role": "user",
-            "content": config.get("USER_PROMPT", "") + "\n\n" + pdf_text if config.get("USER_PROMPT") else pdf_text
-        }
-    ]
-    
-    # Call the API
+    messages = _build_text_messages(extract_text_from_pdf(pdf_path), config)
     return call_openrouter_api(
         config["API_KEY"],
         config["BASE_URL"],
         config["MODEL"],
         messages,
-        {
-            "temperature": float(config.get("TEMPERATURE", 0.7)),
-            "top_p": float(config.get("TOP_P", 1.0)),
-            "stream": config.get("STREAM", "false").lower() == "true",
-            "provider": _parse_json_config_value(config.get("PROVIDER"), default={"data_collection": "deny"}),
-            "response_format": _parse_json_config_value(config.get("RESPONSE_FORMAT"), default={"type": "text"})
-        }
+        prepared if prepared is not None else prepare_config(config)
     )
 
-def process_image(image_path, config):
+def process_image(image_path, config, prepared=None):
     """
     Process an image file through the OpenRouter API
     
     Args:
         image_path (str): Path to the image file or URL
         config (dict): Configuration parameters
+        prepared (dict, optional): Options from prepare_config(config), to skip rebuilding them
         
     Returns:
         dict: The API response
     """
-    # For local files, read and encode as base64
-    if image_path.startswith(('http://', 'https://')):
-        # For remote URLs, pass the URL directly
-        image_content = image_path
-    else:
-        # For local files, read and encode as base64
-        with open(image_path, 'rb') as image_file:
-            image_data = image_file.read()
-            image_content = f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}"
-    
-    # Prepare messages with image content
-    messages = [
-        {
-            "role": "system",
-            "content": config.get("SYSTEM_PROMPT", "You are a helpful assistant.")
-        },
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": config.get("USER_PROMPT", "Describe this image in detail.")
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {"url": image_content}
-                }
-            ]
-        }
-    ]
-    
-    # Call the API
+    messages = _build_image_messages(image_path, config)
     return call_openrouter_api(
         config["API_KEY"],
         config["BASE_URL"],
         config["MODEL"],
         messages,
-        {
-            "temperature": float(config.get("TEMPERATURE", 0.7)),
-            "top_p": float(config.get("TOP_P", 1.0)),
-            "stream": config.get("STREAM", "false").lower() == "true",
-            "provider": _parse_json_config_value(config.get("PROVIDER"), default={"data_collection": "deny"}),
-            "response_format": _parse_json_config_value(config.get("RESPONSE_FORMAT"), default={"type": "text"})
-        }
+        prepared if prepared is not None else prepare_config(config)
+    )
+
+async def aprocess_text(text_file, config, prepared=None):
+    """
+    Async variant of process_text
+    """
+    messages = _build_text_messages(_read_text_file(text_file), config)
+    return await acall_openrouter_api(
+        config["API_KEY"],
+        config["BASE_URL"],
+        config["MODEL"],
+        messages,
+        prepared if prepared is not None else prepare_config(config)
+    )
+
+async def aprocess_pdf(pdf_path, config, prepared=None):
+    """
+    Async variant of process_pdf. PDF text extraction runs in the default
+    executor so it does not block the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    pdf_text = await loop.run_in_executor(None, extract_text_from_pdf, pdf_path)
+    messages = _build_text_messages(pdf_text, config)
+    return await acall_openrouter_api(
+        config["API_KEY"],
+        config["BASE_URL"],
+        config["MODEL"],
+        messages,
+        prepared if prepared is not None else prepare_config(config)
+    )
+
+async def aprocess_image(image_path, config, prepared=None):
+    """
+    Async variant of process_image
+    """
+    messages = _build_image_messages(image_path, config)
+    return await acall_openrouter_api(
+        config["API_KEY"],
+        config["BASE_URL"],
+        config["MODEL"],
+        messages,
+        prepared if prepared is not None else prepare_config(config)
     )
 
 # Helper function to safely parse JSON values from config
@@ -209,19 +587,33 @@ def _parse_json_config_value(value_str, default=None):
     """
     Safely parses a JSON string read from config (potentially multi-line),
     returning default on error. Attempts to clean up line continuation chars.
+    Parsed values are memoized per raw string; each call gets its own copy.
     """
     if not value_str:
         return default
+    parsed, error = _parse_json_config_value_cached(value_str)
+    if error is not None:
+        print(f"Warning: {error}. Using default: {default}", file=sys.stderr)
+        return default
+    # Hand out a copy so callers can't mutate the cached object
+    return copy.deepcopy(parsed)
+
+@functools.lru_cache(maxsize=128)
+def _parse_json_config_value_cached(value_str):
+    """
+    Parse a raw config string as JSON once per distinct value.
+
+    Returns:
+        tuple: (parsed_value, None) on success, or (None, error_message) on failure.
+    """
     try:
         # Clean up potential multi-line artifacts from load_config:
         # 1. Remove backslash-newline combinations used for line continuation.
         # 2. Remove any remaining standalone newline characters within the string.
         cleaned_value_str = value_str.replace('\\\n', '').replace('\n', '')
         # Now attempt to parse the cleaned string as JSON
-        return json.loads(cleaned_value_str)
+        return json.loads(cleaned_value_str), None
     except json.JSONDecodeError as e:
-        print(f"Warning: Could not parse config value as JSON: '{value_str[:100]}...'. Error: {e}. Using default: {default}", file=sys.stderr)
-        return default
+        return None, f"Could not parse config value as JSON: '{value_str[:100]}...'. Error: {e}"
     except Exception as e: # Catch other potential errors during cleaning/parsing
-        print(f"Warning: Unexpected error parsing config value: '{value_str[:100]}...'. Error: {e}. Using default: {default}", file=sys.stderr)
-        return default
+        return None, f"Unexpected error parsing config value: '{value_str[:100]}...'. Error: {e}"
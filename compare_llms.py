@@ -7,24 +7,41 @@ on text extracted from an image or PDF, using existing openrouter_client and
 json_comparator components.
 """
 
-import argparse
 import os
+import re
+import stat
 import sys
-import subprocess
-import tempfile
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import db_logger # Import the new module
-import base64 # For encoding image/pdf input
+import logging
+import hashlib # For fingerprinting local image input in the logs
 import json # For parsing JSON output from NER steps
+# orjson is optional (pip install openrouter-client[fast]); it parses large NER
+# outputs several times faster than the stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 # Need config loader and input type detector from other modules
 try:
-    from config_handler import load_config
+    from config_handler import load_config, get_api_request_details
     from utils import determine_input_type
+    from openrouter_client import run_openrouter_processing, run_openrouter_text_processing, get_response_content
+    from json_comparator import run_json_comparison, write_json_file
 except ImportError:
     # Fallback if running script directly without package install
-    print("Warning: Running compare_llms.py directly. Assuming config_handler.py and utils.py are in the same directory.", file=sys.stderr)
-    from config_handler import load_config
+    print("Warning: Running compare_llms.py directly. Assuming config_handler.py, utils.py, openrouter_client.py and json_comparator.py are in the same directory.", file=sys.stderr)
+    from config_handler import load_config, get_api_request_details
     from utils import determine_input_type
+    from openrouter_client import run_openrouter_processing, run_openrouter_text_processing, get_response_content
+    from json_comparator import run_json_comparison, write_json_file
+
+# Matches every character that is not alphanumeric, '_' or '-'. \w follows the
+# same Unicode rules as str.isalnum(), so ASCII and non-ASCII names are both
+# sanitized in a single C-level pass.
+_FILENAME_SANITIZE_RE = re.compile(r'[^\w-]')
 
 def generate_comparison_output_filename(input_path):
     """
@@ -37,115 +54,260 @@ def generate_comparison_output_filename(input_path):
         str: Default output filename (e.g., "document_comparison.json").
     """
     # Handle potential URLs by extracting the last part
-    if '/' in input_path:
-        basename = input_path.split('/')[-1]
-    else:
-        basename = input_path
+    basename = input_path.rpartition('/')[2]
 
     # Remove query parameters or fragments from URLs if present
-    basename = basename.split('?')[0].split('#')[0]
+    basename = basename.partition('?')[0].partition('#')[0]
 
     name_without_ext = os.path.splitext(basename)[0]
     # Sanitize filename (optional, basic example)
-    safe_name = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name_without_ext)
+    safe_name = _FILENAME_SANITIZE_RE.sub('_', name_without_ext)
     return f"{safe_name}_comparison.json"
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Compare NER results from two LLMs on text extracted from an image/PDF.",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
-    )
+def _write_debug_file(path, content):
+    """
+    Write an intermediate result to disk for inspection in debug mode.
 
-    # Required Arguments
-    parser.add_argument("--input", required=True, help="Path or URL to the input image or PDF file.")
-    parser.add_argument("--vlm-config", required=True, help="Path to the configuration file for the VLM text extraction step.")
-    parser.add_argument("--ner-config1", required=True, help="Path to the configuration file for the first NER LLM.")
-    parser.add_argument("--ner-config2", required=True, help="Path to the configuration file for the second NER LLM.")
+    Args:
+        path (str): Destination file path.
+        content (str): Text to write.
+    """
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        print(f"  Debug: intermediate output saved to: {path}")
+    except OSError as e:
+        print(f"  Warning: Could not write debug file '{path}'. {e}", file=sys.stderr)
+
+def _json_loads(text):
+    """Parse JSON with orjson when installed; both parsers raise json.JSONDecodeError on bad input."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def _describe_local_file(path):
+    """
+    Describe a local input file for the VLM task log without storing its contents.
+    The file is hashed in chunks, so large images are never held in memory; on
+    Python 3.11+ hashlib.file_digest does this in C with the GIL released.
 
-    # Optional Arguments
-    output_group = parser.add_mutually_exclusive_group()
-    output_group.add_argument("--output", help="Full path (directory + filename) for the final JSON comparison result file.")
-    output_group.add_argument("--output-path", help="Directory path where the final JSON comparison result file should be saved (uses auto-generated filename).")
+    Args:
+        path (str): Path to the local input file.
 
-    parser.add_argument("--temp-dir", help="Directory path to store intermediate files. If not provided, uses the system's default temporary directory.")
-    parser.add_argument("--debug", action='store_true', help="If set, keeps intermediate temporary files and enables verbose logging.")
-    parser.add_argument("--db-config", default="db_config.ini", help="Path to the database configuration file.") # Added DB config arg
+    Returns:
+        str: JSON object with the file's absolute path, size and SHA-256 digest.
+    """
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            digest = hashlib.file_digest(f, 'sha256')
+        else:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        size = os.fstat(f.fileno()).st_size
+    return json.dumps({"path": os.path.abspath(path), "size": size, "sha256": digest.hexdigest()})
 
-    args = parser.parse_args()
+def _require_path(path, description, want_dir=False):
+    """
+    Exit with an error unless path is an existing file (or directory if want_dir).
+    Existence and type are checked with a single stat call.
 
-    # --- Initial Validations ---
-    # Validate input file/URL (basic check for local files)
-    if not args.input.startswith(('http://', 'https://')) and not os.path.exists(args.input):
-        print(f"Error: Input file '{args.input}' does not exist.", file=sys.stderr)
+    Args:
+        path (str): Path to check.
+        description (str): What the path is, used in the error message (e.g., "Configuration file").
+        want_dir (bool): Whether path must be a directory rather than a regular file.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        print(f"Error: {description} '{path}' does not exist.", file=sys.stderr)
+        sys.exit(1)
+    if want_dir and not stat.S_ISDIR(st.st_mode):
+        print(f"Error: {description} '{path}' is not a valid directory.", file=sys.stderr)
+        sys.exit(1)
+    if not want_dir and not stat.S_ISREG(st.st_mode):
+        print(f"Error: {description} '{path}' is not a file.", file=sys.stderr)
         sys.exit(1)
 
-    # Validate config files exist
-    config_files_to_check = [args.vlm_config, args.ner_config1, args.ner_config2, args.db_config]
-    for config_path in config_files_to_check:
-        if not os.path.exists(config_path):
-            print(f"Error: Configuration file '{config_path}' does not exist.", file=sys.stderr)
-            sys.exit(1)
+def _start_task(conn, db_lock, job_id, task_order, task_type, details, job_in_progress=False):
+    """
+    Create a task with its input details. Submitted to the logging executor so the
+    insert overlaps the LLM call that follows instead of delaying it. The task is
+    not marked running; its start time is written by db_logger.complete_task
+    together with the final status.
 
-    # Validate output-path if provided
-    if args.output_path and not os.path.isdir(args.output_path):
-        print(f"Error: Output path '{args.output_path}' is not a valid directory.", file=sys.stderr)
-        sys.exit(1)
+    Args:
+        conn: Database connection object shared with the caller.
+        db_lock (threading.Lock): Lock serializing use of conn.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        task_type (str): 'vlm_extraction', 'ner_processing' or 'json_comparison'.
+        details (dict): Input details for the task, or None if they could not be prepared.
+        job_in_progress (bool): Also move the job to 'in-progress' (for the first task).
 
-    # Validate temp-dir if provided
-    if args.temp_dir and not os.path.isdir(args.temp_dir):
-        print(f"Error: Temporary directory '{args.temp_dir}' is not a valid directory.", file=sys.stderr)
-        sys.exit(1)
+    Returns:
+        str: UUID of the new task, or None if it could not be created.
+    """
+    with db_lock:
+        if not job_in_progress:
+            return db_logger.create_task_with_details(conn, job_id, task_order, task_type, details)
+        try:
+            with db_logger.begin(conn) as tx:
+                task_id = db_logger.create_task_with_details(tx, job_id, task_order, task_type, details)
+                if task_id is not None:
+                    db_logger.update_job_status(tx, job_id, 'in-progress')
+        except Exception:
+            return None # The commit failed (begin() has logged it), so the task was not stored
+    return task_id
+
+def _run_ner_step(conn, db_lock, db_executor, job_id, task_order, label, ner_config_path, input_text, debug_output_path):
+    """
+    Run one NER step (task record, input logging, LLM call, output logging).
+    Safe to run in a worker thread: every database call is made while holding db_lock.
+
+    Args:
+        conn: Database connection object shared with the caller.
+        db_lock (threading.Lock): Lock serializing use of conn.
+        db_executor (ThreadPoolExecutor): Executor the task record is created on
+            while the LLM call is in flight.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        label (str): Step name used in messages (e.g., "NER1").
+        ner_config_path (str): Path to the NER configuration file.
+        input_text (str): Text extracted by the VLM step.
+        debug_output_path (str): Where to write the raw NER output, or None outside debug mode.
+
+    Returns:
+        tuple: (task_id, output_json, error_msg). output_json is None if the output
+               was not valid JSON; error_msg is None unless the step failed.
+    """
+    ner_details = None
+    try:
+        ner_config_data = load_config(ner_config_path)
+        ner_details = {
+            'input_text': input_text,
+            **get_api_request_details(ner_config_data)
+        }
+    except Exception as log_err:
+        print(f"Warning: Failed to prepare {label} input details: {log_err}", file=sys.stderr)
+    # Log the task in the background while the NER call runs
+    start_time = datetime.now(timezone.utc)
+    task_future = db_executor.submit(_start_task, conn, db_lock, job_id, task_order, 'ner_processing', ner_details)
+
+    # Ensure the NER config specifies JSON output format
+    ner_response = run_openrouter_text_processing(input_text, ner_config_path)
+    task_id = task_future.result()
+    if task_id is None:
+        return None, None, f"Failed to create {label} task record."
+    if "error" in ner_response:
+        error_msg = str(ner_response["error"])
+        print(f"  Error during {label} step:\n{error_msg}", file=sys.stderr)
+        with db_lock:
+            db_logger.complete_task(conn, task_id, 'failed', start_time, error_msg)
+        return task_id, None, error_msg
+
+    ner_output_text = get_response_content(ner_response)
+    if ner_output_text is None:
+        # The API can return a choice whose message content is null
+        error_msg = f"{label} response contained no message content."
+        print(f"  Error during {label} step:\n{error_msg}", file=sys.stderr)
+        with db_lock:
+            db_logger.complete_task(conn, task_id, 'failed', start_time, error_msg)
+        return task_id, None, error_msg
+    if debug_output_path:
+        _write_debug_file(debug_output_path, ner_output_text)
+    # Log NER output details
+    ner_output_json = None
+    try:
+        ner_output_json = _json_loads(ner_output_text) # Parse JSON data
+    except json.JSONDecodeError as json_err:
+         print(f"Warning: Could not parse {label} output as JSON for logging: {json_err}", file=sys.stderr)
+    try:
+        with db_lock, db_logger.begin(conn) as tx:
+            if ner_output_json is not None:
+                db_logger.update_task_details_output(tx, task_id, 'ner_processing', {'output_json': ner_output_json}, api_response_id=ner_response.get('id'))
+            db_logger.complete_task(tx, task_id, 'completed', start_time)
+    except Exception as db_err:
+        return task_id, None, f"Failed to record {label} output: {db_err}"
+    print(f"  {label} completed.")
+    return task_id, ner_output_json, None
+
+def run_llm_comparison(input_path, vlm_config, ner_config1, ner_config2, output=None, output_path=None,
+                       temp_dir=None, debug=False, db_config="db_config.ini"):
+    """
+    Run the VLM -> NER1/NER2 -> comparison workflow on one input, logging it to the database.
+
+    Args:
+        input_path (str): Path or URL to the input image, PDF or text file.
+        vlm_config (str): Configuration file for the VLM text extraction step.
+        ner_config1 (str): Configuration file for the first NER LLM.
+        ner_config2 (str): Configuration file for the second NER LLM.
+        output (str, optional): Full path for the comparison result file.
+        output_path (str, optional): Directory for the result file, with an auto-generated name.
+        temp_dir (str, optional): Parent directory for the per-run debug folder.
+        debug (bool): Write intermediate results to files and log every database write.
+        db_config (str): Path to the database configuration file.
+
+    Returns:
+        str: Path of the comparison result file, or None if the workflow failed.
+    """
+    import tempfile
 
     # --- Determine Paths ---
-    temp_directory = args.temp_dir if args.temp_dir else tempfile.gettempdir()
-    temp_files = [] # To keep track of files for cleanup
+    # Intermediate results are passed in memory; in debug mode they are also written
+    # to a dedicated per-run directory (under --temp-dir if given) that is kept for inspection
+    temp_directory = tempfile.mkdtemp(prefix="compare_llms_", dir=temp_dir) if debug else None
 
     # Determine final output path
-    if args.output:
-        final_output_path = args.output
+    if output:
+        final_output_path = output
         # Ensure output directory exists if specified in --output
         output_dir = os.path.dirname(final_output_path)
-        if output_dir and not os.path.exists(output_dir):
+        if output_dir:
              try:
-                 os.makedirs(output_dir)
-                 if args.debug: print(f"Created output directory: {output_dir}")
+                 os.makedirs(output_dir, exist_ok=True)
              except OSError as e:
                  print(f"Error: Could not create output directory '{output_dir}'. {e}", file=sys.stderr)
-                 sys.exit(1)
-    elif args.output_path:
-        default_filename = generate_comparison_output_filename(args.input)
-        final_output_path = os.path.join(args.output_path, default_filename)
+                 return None
+    elif output_path:
+        default_filename = generate_comparison_output_filename(input_path)
+        final_output_path = os.path.join(output_path, default_filename)
     else:
         # Default to current working directory
-        default_filename = generate_comparison_output_filename(args.input)
+        default_filename = generate_comparison_output_filename(input_path)
         final_output_path = default_filename
 
-    if args.debug:
+    if debug:
         print(f"--- Configuration ---")
-        print(f"Input: {args.input}")
-        print(f"VLM Config: {args.vlm_config}")
-        print(f"NER Config 1: {args.ner_config1}")
-        print(f"NER Config 2: {args.ner_config2}")
-        print(f"DB Config: {args.db_config}") # Added DB config path
+        print(f"Input: {input_path}")
+        print(f"VLM Config: {vlm_config}")
+        print(f"NER Config 1: {ner_config1}")
+        print(f"NER Config 2: {ner_config2}")
+        print(f"DB Config: {db_config}") # Added DB config path
         print(f"Final Output Path: {final_output_path}")
         print(f"Temporary Directory: {temp_directory}")
-        print(f"Debug Mode: {args.debug}")
+        print(f"Debug Mode: {debug}")
         print(f"---------------------\n")
 
     # --- Workflow Implementation ---
     print("Starting LLM comparison workflow...")
-    python_executable = sys.executable # Use the same python that's running this script
+    if debug:
+        db_logger.logger.setLevel(logging.DEBUG) # Report every database write, not just failures
 
     # --- Database Setup ---
-    conn = db_logger.connect_db(args.db_config)
+    conn = db_logger.connect_db(db_config)
     if conn is None:
         print("Exiting due to database connection failure.", file=sys.stderr)
-        sys.exit(1)
+        return None
 
     job_id = None # Initialize job_id
+    # Task records are written on a background thread so they overlap the LLM
+    # calls; db_lock keeps that thread and the NER workers off conn at the same time
+    db_lock = threading.Lock()
+    db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="db_logger")
     try:
         # Create Job Record
-        job_id = db_logger.create_job(conn, 'compare_llms', args.input)
+        job_id = db_logger.create_job(conn, 'compare_llms', input_path)
         if job_id is None:
             raise Exception("Failed to create job record in database.") # Or handle more gracefully
 
@@ -153,288 +315,202 @@ def main():
 
         # Step 1: VLM Text Extraction
         task1_id = None # Initialize task ID
+        vlm_input_text = None # Local text input, read once for both logging and the VLM call
         print("\nStep 1: Extracting text using VLM...")
-        task1_id = db_logger.create_task(conn, job_id, 1, 'vlm_extraction')
-        if task1_id is None: raise Exception("Failed to create VLM task record.")
-        # Log VLM input details
+        # Prepare VLM input details
+        vlm_details = None
         try:
-            vlm_config_data = load_config(args.vlm_config)
-            input_type = determine_input_type(args.input)
-            input_content = args.input # Default for URL or text
-            input_content_type = 'url' if args.input.startswith(('http://', 'https://')) else 'text' # Initial guess
-
-            if input_type == 'image' and not args.input.startswith(('http://', 'https://')):
-                 input_content_type = 'image_base64'
-                 with open(args.input, 'rb') as f:
-                     input_content = base64.b64encode(f.read()).decode('utf-8')
-            elif input_type == 'pdf' and not args.input.startswith(('http://', 'https://')):
+            vlm_config_data = load_config(vlm_config)
+            input_type = determine_input_type(input_path)
+            input_content = input_path # Default for URL or text
+            input_content_type = 'url' if input_path.startswith(('http://', 'https://')) else 'text' # Initial guess
+
+            if input_type == 'image' and not input_path.startswith(('http://', 'https://')):
+                 input_content_type = 'file_ref'
+                 # Log a reference to the file rather than the full base64 payload;
+                 # the web app encodes it on demand when a preview is requested.
+                 input_content = _describe_local_file(input_path)
+            elif input_type == 'pdf' and not input_path.startswith(('http://', 'https://')):
                  input_content_type = 'pdf_base64'
                  # Note: We might not want to log the *entire* base64 PDF content due to size.
                  # Consider logging only metadata or a truncated version, or skipping content logging for PDFs.
                  # For now, logging path as content placeholder for large files.
-                 # input_content = base64.b64encode(open(args.input, 'rb').read()).decode('utf-8')
-                 input_content = f"local_pdf_path:{args.input}" # Placeholder
-            elif input_type == 'text' and not args.input.startswith(('http://', 'https://')):
+                 # input_content = base64.b64encode(open(input_path, 'rb').read()).decode('utf-8')
+                 input_content = f"local_pdf_path:{input_path}" # Placeholder
+            elif input_type == 'text' and not input_path.startswith(('http://', 'https://')):
                  input_content_type = 'text'
-                 with open(args.input, 'r', encoding='utf-8') as f:
+                 with open(input_path, 'r', encoding='utf-8') as f:
                      input_content = f.read() # Log actual text content
+                 vlm_input_text = input_content
 
             vlm_details = {
-                'input_source': args.input,
+                'input_source': input_path,
                 'input_content_type': input_content_type,
                 'input_content': input_content, # Be mindful of size for base64
-                'api_request_model': vlm_config_data.get('MODEL'),
-                'api_request_system_prompt': vlm_config_data.get('SYSTEM_PROMPT'),
-                'api_request_user_prompt': vlm_config_data.get('USER_PROMPT'),
-                'api_request_temperature': float(vlm_config_data.get('TEMPERATURE', 0.7)),
-                'api_request_top_p': float(vlm_config_data.get('TOP_P', 1.0)),
-                'api_request_stream': vlm_config_data.get('STREAM', 'false').lower() == 'true',
-                'api_request_response_format': json.loads(vlm_config_data['RESPONSE_FORMAT']) if vlm_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': vlm_config_data.get('RESPONSE_FORMAT', 'text')},
-                'api_request_provider_options': json.loads(vlm_config_data['PROVIDER']) if vlm_config_data.get('PROVIDER', '').startswith('{') else None
+                **get_api_request_details(vlm_config_data)
             }
-            db_logger.log_vlm_details(conn, task1_id, vlm_details)
         except Exception as log_err:
-            print(f"Warning: Failed to log VLM input details for task {task1_id}: {log_err}", file=sys.stderr)
+            print(f"Warning: Failed to prepare VLM input details: {log_err}", file=sys.stderr)
             # Continue workflow even if logging fails? Or handle more strictly?
 
-        db_logger.update_task_status(conn, task1_id, 'running')
-        db_logger.update_job_status(conn, job_id, 'in-progress') # Update job status once first task starts
+        # Log the task (and the job going in-progress) in the background while the VLM call runs
+        task1_start_time = datetime.now(timezone.utc)
+        task1_future = db_executor.submit(_start_task, conn, db_lock, job_id, 1, 'vlm_extraction', vlm_details, job_in_progress=True)
 
         # Step 1: VLM Text Extraction
         print("\nStep 1: Extracting text using VLM...")
-        temp_vlm_output_path = os.path.join(temp_directory, f"compare_llms_vlm_{os.path.basename(args.input)}.txt")
-        temp_files.append(temp_vlm_output_path)
-        vlm_command = [
-            python_executable, "-m", "openrouter_client",
-            "--input", args.input,
-            "--config", args.vlm_config,
-            "--output", temp_vlm_output_path
-        ]
-        if args.debug: print(f"  Running VLM command: {' '.join(vlm_command)}")
-        try:
-            vlm_result = subprocess.run(vlm_command, check=True, capture_output=True, text=True)
-            print(f"  VLM output saved to: {temp_vlm_output_path}")
-            # Log VLM output details
-            try:
-                with open(temp_vlm_output_path, 'r', encoding='utf-8') as f:
-                    vlm_output_text_result = f.read()
-                # Assuming api_response_id is not directly available from openrouter_client output file for now
-                db_logger.update_task_details_output(conn, task1_id, 'vlm_extraction', {'output_text': vlm_output_text_result}, api_response_id=None)
-            except Exception as read_err:
-                 print(f"Warning: Could not read VLM output file {temp_vlm_output_path} for logging output details: {read_err}", file=sys.stderr)
-            db_logger.update_task_status(conn, task1_id, 'completed')
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Command: {' '.join(e.cmd)}\nStderr: {e.stderr}"
+        if debug: print(f"  Running VLM in-process: input={input_path} config={vlm_config}")
+        if vlm_input_text is not None:
+            vlm_response = run_openrouter_text_processing(vlm_input_text, vlm_config)
+        else:
+            vlm_response = run_openrouter_processing(input_path, vlm_config)
+        task1_id = task1_future.result()
+        if task1_id is None: raise Exception("Failed to create VLM task record.")
+        if "error" in vlm_response:
+            error_msg = str(vlm_response["error"])
             print(f"  Error during VLM step:\n{error_msg}", file=sys.stderr)
-            if task1_id: db_logger.update_task_status(conn, task1_id, 'failed', error_msg)
-            if job_id: db_logger.update_job_status(conn, job_id, 'failed', f"VLM step failed: {error_msg}")
-            raise # Re-raise to stop workflow and trigger finally
-
-
-        # Step 2a: NER Run 1
-        # Step 2a: NER Run 1
-        task2_id = None
-        print("\nStep 2a: Running NER with Config 1...")
-        task2_id = db_logger.create_task(conn, job_id, 2, 'ner_processing')
-        if task2_id is None: raise Exception("Failed to create NER1 task record.")
-        # Log NER1 input details
-        try:
-            ner1_config_data = load_config(args.ner_config1)
-            # Read the extracted text from the VLM output file
-            vlm_output_text = ""
-            try:
-                with open(temp_vlm_output_path, 'r', encoding='utf-8') as f:
-                    vlm_output_text = f.read()
-            except Exception as read_err:
-                 print(f"Warning: Could not read VLM output file {temp_vlm_output_path} for NER1 logging: {read_err}", file=sys.stderr)
-                 # Decide if this is critical - perhaps raise?
-
-            ner1_details = {
-                'input_text': vlm_output_text,
-                'api_request_model': ner1_config_data.get('MODEL'),
-                'api_request_system_prompt': ner1_config_data.get('SYSTEM_PROMPT'),
-                'api_request_user_prompt': ner1_config_data.get('USER_PROMPT'),
-                'api_request_temperature': float(ner1_config_data.get('TEMPERATURE', 0.7)),
-                'api_request_top_p': float(ner1_config_data.get('TOP_P', 1.0)),
-                'api_request_stream': ner1_config_data.get('STREAM', 'false').lower() == 'true',
-                'api_request_response_format': json.loads(ner1_config_data['RESPONSE_FORMAT']) if ner1_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': ner1_config_data.get('RESPONSE_FORMAT', 'text')},
-                'api_request_provider_options': json.loads(ner1_config_data['PROVIDER']) if ner1_config_data.get('PROVIDER', '').startswith('{') else None
-            }
-            db_logger.log_ner_details(conn, task2_id, ner1_details)
-        except Exception as log_err:
-            print(f"Warning: Failed to log NER1 input details for task {task2_id}: {log_err}", file=sys.stderr)
-
-        db_logger.update_task_status(conn, task2_id, 'running')
-        temp_ner1_output_path = os.path.join(temp_directory, f"compare_llms_ner1_{os.path.basename(args.input)}.json")
-        temp_files.append(temp_ner1_output_path)
-        ner1_command = [
-            python_executable, "-m", "openrouter_client",
-            "--input", temp_vlm_output_path, # Use VLM output as input
-            "--config", args.ner_config1,
-            "--output", temp_ner1_output_path
-            # Ensure ner-config1 specifies json output format
-        ]
-        if args.debug: print(f"  Running NER1 command: {' '.join(ner1_command)}")
-        try:
-            ner1_result = subprocess.run(ner1_command, check=True, capture_output=True, text=True)
-            print(f"  NER1 output saved to: {temp_ner1_output_path}")
-            # Log NER1 output details
-            try:
-                with open(temp_ner1_output_path, 'r', encoding='utf-8') as f:
-                    ner1_output_json_result = json.load(f) # Load JSON data
-                # Assuming api_response_id is not directly available
-                db_logger.update_task_details_output(conn, task2_id, 'ner_processing', {'output_json': ner1_output_json_result}, api_response_id=None)
-            except json.JSONDecodeError as json_err:
-                 print(f"Warning: Could not parse NER1 output file {temp_ner1_output_path} as JSON for logging: {json_err}", file=sys.stderr)
-            except Exception as read_err:
-                 print(f"Warning: Could not read NER1 output file {temp_ner1_output_path} for logging output details: {read_err}", file=sys.stderr)
-            db_logger.update_task_status(conn, task2_id, 'completed')
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Command: {' '.join(e.cmd)}\nStderr: {e.stderr}"
-            print(f"  Error during NER1 step:\n{error_msg}", file=sys.stderr)
-            if task2_id: db_logger.update_task_status(conn, task2_id, 'failed', error_msg)
-            if job_id: db_logger.update_job_status(conn, job_id, 'failed', f"NER1 step failed: {error_msg}")
-            raise
-
-        # Step 2b: NER Run 2
-        # Step 2b: NER Run 2
-        task3_id = None
-        print("\nStep 2b: Running NER with Config 2...")
-        task3_id = db_logger.create_task(conn, job_id, 3, 'ner_processing')
-        if task3_id is None: raise Exception("Failed to create NER2 task record.")
-        # Log NER2 input details
-        try:
-            ner2_config_data = load_config(args.ner_config2)
-             # Read the extracted text from the VLM output file (again, could optimize)
-            vlm_output_text_ner2 = ""
-            try:
-                # Re-read in case something went wrong before, or could pass vlm_output_text variable
-                with open(temp_vlm_output_path, 'r', encoding='utf-8') as f:
-                    vlm_output_text_ner2 = f.read()
-            except Exception as read_err:
-                 print(f"Warning: Could not read VLM output file {temp_vlm_output_path} for NER2 logging: {read_err}", file=sys.stderr)
-
-            ner2_details = {
-                'input_text': vlm_output_text_ner2,
-                'api_request_model': ner2_config_data.get('MODEL'),
-                'api_request_system_prompt': ner2_config_data.get('SYSTEM_PROMPT'),
-                'api_request_user_prompt': ner2_config_data.get('USER_PROMPT'),
-                'api_request_temperature': float(ner2_config_data.get('TEMPERATURE', 0.7)),
-                'api_request_top_p': float(ner2_config_data.get('TOP_P', 1.0)),
-                'api_request_stream': ner2_config_data.get('STREAM', 'false').lower() == 'true',
-                'api_request_response_format': json.loads(ner2_config_data['RESPONSE_FORMAT']) if ner2_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': ner2_config_data.get('RESPONSE_FORMAT', 'text')},
-                'api_request_provider_options': json.loads(ner2_config_data['PROVIDER']) if ner2_config_data.get('PROVIDER', '').startswith('{') else None
-            }
-            db_logger.log_ner_details(conn, task3_id, ner2_details)
-        except Exception as log_err:
-            print(f"Warning: Failed to log NER2 input details for task {task3_id}: {log_err}", file=sys.stderr)
-
-        db_logger.update_task_status(conn, task3_id, 'running')
-        temp_ner2_output_path = os.path.join(temp_directory, f"compare_llms_ner2_{os.path.basename(args.input)}.json")
-        temp_files.append(temp_ner2_output_path)
-        ner2_command = [
-            python_executable, "-m", "openrouter_client",
-            "--input", temp_vlm_output_path, # Use VLM output as input
-            "--config", args.ner_config2,
-            "--output", temp_ner2_output_path
-            # Ensure ner-config2 specifies json output format
-        ]
-        if args.debug: print(f"  Running NER2 command: {' '.join(ner2_command)}")
-        try:
-            ner2_result = subprocess.run(ner2_command, check=True, capture_output=True, text=True)
-            print(f"  NER2 output saved to: {temp_ner2_output_path}")
-            # Log NER2 output details
-            try:
-                with open(temp_ner2_output_path, 'r', encoding='utf-8') as f:
-                    ner2_output_json_result = json.load(f) # Load JSON data
-                # Assuming api_response_id is not directly available
-                db_logger.update_task_details_output(conn, task3_id, 'ner_processing', {'output_json': ner2_output_json_result}, api_response_id=None)
-            except json.JSONDecodeError as json_err:
-                 print(f"Warning: Could not parse NER2 output file {temp_ner2_output_path} as JSON for logging: {json_err}", file=sys.stderr)
-            except Exception as read_err:
-                 print(f"Warning: Could not read NER2 output file {temp_ner2_output_path} for logging output details: {read_err}", file=sys.stderr)
-            db_logger.update_task_status(conn, task3_id, 'completed')
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Command: {' '.join(e.cmd)}\nStderr: {e.stderr}"
-            print(f"  Error during NER2 step:\n{error_msg}", file=sys.stderr)
-            if task3_id: db_logger.update_task_status(conn, task3_id, 'failed', error_msg)
-            if job_id: db_logger.update_job_status(conn, job_id, 'failed', f"NER2 step failed: {error_msg}")
-            raise
+            with db_logger.begin(conn) as tx:
+                db_logger.complete_task(tx, task1_id, 'failed', task1_start_time, error_msg)
+                db_logger.update_job_status(tx, job_id, 'failed', f"VLM step failed: {error_msg}")
+            raise Exception(f"VLM step failed: {error_msg}") # Stop workflow and trigger finally
+        vlm_output_text = get_response_content(vlm_response)
+        if vlm_output_text is None:
+            # The API can return a choice whose message content is null
+            error_msg = "VLM response contained no message content."
+            print(f"  Error during VLM step:\n{error_msg}", file=sys.stderr)
+            with db_logger.begin(conn) as tx:
+                db_logger.complete_task(tx, task1_id, 'failed', task1_start_time, error_msg)
+                db_logger.update_job_status(tx, job_id, 'failed', f"VLM step failed: {error_msg}")
+            raise Exception(f"VLM step failed: {error_msg}") # Stop workflow and trigger finally
+        if debug:
+            temp_vlm_output_path = os.path.join(temp_directory, f"compare_llms_vlm_{os.path.basename(input_path)}.txt")
+            _write_debug_file(temp_vlm_output_path, vlm_output_text)
+        # Log VLM output details
+        with db_logger.begin(conn) as tx:
+            db_logger.update_task_details_output(tx, task1_id, 'vlm_extraction', {'output_text': vlm_output_text}, api_response_id=vlm_response.get('id'))
+            db_logger.complete_task(tx, task1_id, 'completed', task1_start_time)
+
+        # Step 2a/2b: NER Runs 1 and 2
+        # The two NER runs are independent, so they run concurrently, each
+        # logging its own task as it progresses. The shared DB connection is
+        # guarded by db_lock so only one thread talks to it at a time.
+        print("\nStep 2a/2b: Running NER with Config 1 and Config 2 concurrently...")
+        temp_ner1_output_path = None
+        temp_ner2_output_path = None
+        if debug:
+            temp_ner1_output_path = os.path.join(temp_directory, f"compare_llms_ner1_{os.path.basename(input_path)}.json")
+            temp_ner2_output_path = os.path.join(temp_directory, f"compare_llms_ner2_{os.path.basename(input_path)}.json")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ner1_future = executor.submit(_run_ner_step, conn, db_lock, db_executor, job_id, 2, "NER1", ner_config1,
+                                          vlm_output_text, temp_ner1_output_path)
+            ner2_future = executor.submit(_run_ner_step, conn, db_lock, db_executor, job_id, 3, "NER2", ner_config2,
+                                          vlm_output_text, temp_ner2_output_path)
+        task2_id, ner1_output_json_result, ner1_error = ner1_future.result()
+        task3_id, ner2_output_json_result, ner2_error = ner2_future.result()
+        for label, error_msg in (("NER1", ner1_error), ("NER2", ner2_error)):
+            if error_msg:
+                if job_id: db_logger.update_job_status(conn, job_id, 'failed', f"{label} step failed: {error_msg}")
+                raise Exception(f"{label} step failed: {error_msg}")
 
-        # Step 3: Comparison
         # Step 3: Comparison
         task4_id = None
         print("\nStep 3: Comparing NER results...")
-        task4_id = db_logger.create_task(conn, job_id, 4, 'json_comparison')
+        # Log Comparison input details (paths only exist when intermediates are kept in debug mode)
+        comparison_details = {
+            'input_json_path1': temp_ner1_output_path if debug else None,
+            'input_json_path2': temp_ner2_output_path if debug else None
+        }
+        task4_start_time = datetime.now(timezone.utc)
+        task4_id = _start_task(conn, db_lock, job_id, 4, 'json_comparison', comparison_details)
         if task4_id is None: raise Exception("Failed to create Comparison task record.")
-        # Log Comparison input details
         try:
-            comparison_details = {
-                'input_json_path1': temp_ner1_output_path,
-                'input_json_path2': temp_ner2_output_path
-            }
-            db_logger.log_comparison_details(conn, task4_id, comparison_details)
-        except Exception as log_err:
-             print(f"Warning: Failed to log Comparison input details for task {task4_id}: {log_err}", file=sys.stderr)
-
-        db_logger.update_task_status(conn, task4_id, 'running')
-        compare_command = [
-            python_executable, "-m", "json_comparator",
-            temp_ner1_output_path, # Positional argument 1
-            temp_ner2_output_path, # Positional argument 2
-            "--output", final_output_path # Optional output argument
-        ]
-        if args.debug: print(f"  Running Comparison command: {' '.join(compare_command)}")
-        try:
-            compare_result = subprocess.run(compare_command, check=True, capture_output=True, text=True)
+            if ner1_output_json_result is None or ner2_output_json_result is None:
+                raise ValueError("NER output is not valid JSON.")
+            comparison_output_json_result = run_json_comparison(ner1_output_json_result, ner2_output_json_result)
+            write_json_file(comparison_output_json_result, final_output_path, pretty=True)
             print(f"  Comparison results saved to: {final_output_path}")
             # Log Comparison output details
-            try:
-                # Read the final comparison output file
-                with open(final_output_path, 'r', encoding='utf-8') as f:
-                    comparison_output_json_result = json.load(f)
-                db_logger.update_task_details_output(conn, task4_id, 'json_comparison', {'output_comparison_json': comparison_output_json_result})
-            except json.JSONDecodeError as json_err:
-                 print(f"Warning: Could not parse Comparison output file {final_output_path} as JSON for logging: {json_err}", file=sys.stderr)
-            except Exception as read_err:
-                 print(f"Warning: Could not read Comparison output file {final_output_path} for logging output details: {read_err}", file=sys.stderr)
-            db_logger.update_task_status(conn, task4_id, 'completed')
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Command: {' '.join(e.cmd)}\nStderr: {e.stderr}"
+            with db_logger.begin(conn) as tx:
+                db_logger.update_task_details_output(tx, task4_id, 'json_comparison', {'output_comparison_json': comparison_output_json_result})
+                db_logger.complete_task(tx, task4_id, 'completed', task4_start_time)
+        except (ValueError, OSError) as e:
+            error_msg = str(e)
             print(f"  Error during Comparison step:\n{error_msg}", file=sys.stderr)
-            if task4_id: db_logger.update_task_status(conn, task4_id, 'failed', error_msg)
-            if job_id: db_logger.update_job_status(conn, job_id, 'failed', f"Comparison step failed: {error_msg}")
+            with db_logger.begin(conn) as tx:
+                db_logger.complete_task(tx, task4_id, 'failed', task4_start_time, error_msg)
+                db_logger.update_job_status(tx, job_id, 'failed', f"Comparison step failed: {error_msg}")
             raise
 
         # If we reach here, all steps succeeded
         if job_id: db_logger.update_job_status(conn, job_id, 'completed')
         print("\nWorkflow completed successfully.")
+        return final_output_path
 
     except Exception as e:
         print(f"\nAn error occurred during the workflow: {e}", file=sys.stderr)
-        # Exit with error code 1 if an exception occurred during the try block
-        sys.exit(1)
+        return None
     finally:
-        # Cleanup temporary files unless in debug mode
-        if not args.debug:
-            print("\nCleaning up temporary files...")
-            for temp_file_path in temp_files:
-                try:
-                    if os.path.exists(temp_file_path):
-                        os.remove(temp_file_path)
-                        # print(f"  Removed: {temp_file_path}") # Optional verbose cleanup
-                except OSError as e:
-                    print(f"  Warning: Could not remove temporary file '{temp_file_path}'. {e}", file=sys.stderr)
-        else:
-            print("\nDebug mode: Skipping temporary file cleanup.")
-            if temp_files: # Only print header if there are files
-                 print("Temporary files:")
-                 for f in temp_files: print(f"  - {f}")
+        # Intermediate results are passed in memory; files only exist in debug mode
+        if debug:
+            print(f"\nDebug mode: Intermediate files kept in: {temp_directory}")
+
+        # Let any in-flight task logging finish before the connection goes back
+        db_executor.shutdown(wait=True)
 
         # Close database connection
         if 'conn' in locals() and conn is not None:
             db_logger.close_db(conn)
 
 
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare NER results from two LLMs on text extracted from an image/PDF.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    # Required Arguments
+    parser.add_argument("--input", required=True, help="Path or URL to the input image or PDF file.")
+    parser.add_argument("--vlm-config", required=True, help="Path to the configuration file for the VLM text extraction step.")
+    parser.add_argument("--ner-config1", required=True, help="Path to the configuration file for the first NER LLM.")
+    parser.add_argument("--ner-config2", required=True, help="Path to the configuration file for the second NER LLM.")
+
+    # Optional Arguments
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument("--output", help="Full path (directory + filename) for the final JSON comparison result file.")
+    output_group.add_argument("--output-path", help="Directory path where the final JSON comparison result file should be saved (uses auto-generated filename).")
+
+    parser.add_argument("--temp-dir", help="Parent directory for the per-run folder of intermediate files written in debug mode. If not provided, uses the system's default temporary directory.")
+    parser.add_argument("--debug", action='store_true', help="If set, writes intermediate results (VLM/NER outputs) to files and enables verbose logging.")
+    parser.add_argument("--db-config", default="db_config.ini", help="Path to the database configuration file.") # Added DB config arg
+
+    args = parser.parse_args()
+    db_logger.log_to_stderr()
+
+    # --- Initial Validations ---
+    # Validate input file/URL (basic check for local files)
+    if not args.input.startswith(('http://', 'https://')):
+        _require_path(args.input, "Input file")
+
+    # Validate config files exist
+    config_files_to_check = [args.vlm_config, args.ner_config1, args.ner_config2, args.db_config]
+    for config_path in config_files_to_check:
+        _require_path(config_path, "Configuration file")
+
+    # Validate output-path if provided
+    if args.output_path:
+        _require_path(args.output_path, "Output path", want_dir=True)
+
+    # Validate temp-dir if provided
+    if args.temp_dir:
+        _require_path(args.temp_dir, "Temporary directory", want_dir=True)
+
+    if run_llm_comparison(args.input, args.vlm_config, args.ner_config1, args.ner_config2,
+                          output=args.output, output_path=args.output_path, temp_dir=args.temp_dir,
+                          debug=args.debug, db_config=args.db_config) is None:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,6 +4,9 @@ Configuration Handler
 Functions for loading and validating configuration files for the OpenRouter API client.
 """
 
+import copy
+import functools
+import json
 import os
 import sys
 
@@ -11,6 +14,8 @@ def load_config(config_file):
     """
     Load and validate configuration from a file.
     Handles multi-line values for all parameters while preserving exact formatting.
+    Parsed files are memoized per (absolute path, modification time), so an edited
+    file is picked up on the next call; each call gets its own copy.
     
     Args:
         config_file (str): Path to the configuration file
@@ -18,30 +23,42 @@ def load_config(config_file):
     Returns:
         dict: Configuration parameters
     """
+    abs_path = os.path.abspath(config_file)
+    return dict(_load_config_cached(abs_path, os.path.getmtime(abs_path)))
+
+@functools.lru_cache(maxsize=128)
+def _load_config_cached(config_file, mtime):
+    """
+    Parse and validate a configuration file once per path and modification time.
+    """
     config = {}
     current_key = None
     current_value = []
     
+    # Read the file in one call and split it in C; universal newline mode has
+    # already normalized line endings to '\n'
     with open(config_file, "r", encoding="utf-8") as f:
-        for line in f:
-            # Skip empty lines and comments
-            stripped = line.strip()
-            if not stripped or stripped.startswith("#"):
-                continue
-                
-            # Handle new key-value pairs
-            if '=' in line and current_key is None:
-                key, value = line.split('=', 1)
-                current_key = key.strip()
-                current_value = [value.rstrip('\\\n')]
-            # Handle value continuations
-            elif current_key is not None:
-                current_value.append(line.rstrip('\\\n'))
-                
-            # Finalize the current value if complete
-            if current_key is not None and not line.rstrip().endswith('\\'):
-                config[current_key] = '\n'.join(current_value).strip()
-                current_key = None
+        lines = f.read().split('\n')
+
+    for line in lines:
+        # Skip empty lines and comments
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+            
+        # Handle new key-value pairs
+        if '=' in line and current_key is None:
+            key, value = line.split('=', 1)
+            current_key = key.strip()
+            current_value = [value.rstrip('\\')]
+        # Handle value continuations
+        elif current_key is not None:
+            current_value.append(line.rstrip('\\'))
+            
+        # Finalize the current value if complete
+        if current_key is not None and not line.rstrip().endswith('\\'):
+            config[current_key] = '\n'.join(current_value).strip()
+            current_key = None
     
     # Validate required parameters
     required_params = ["API_KEY", "BASE_URL", "MODEL"]
@@ -66,3 +83,35 @@ def load_config(config_file):
             config[key] = value
     
     return config
+
+def get_api_request_details(config):
+    """
+    Build the api_request_* fields logged for an LLM task from a loaded configuration.
+    JSON-valued options (RESPONSE_FORMAT, PROVIDER) are parsed once per distinct value.
+    
+    Args:
+        config (dict): Configuration parameters from load_config
+        
+    Returns:
+        dict: api_request_* fields for the db_logger log_*_details functions
+    """
+    response_format = config.get('RESPONSE_FORMAT', 'text')
+    provider = config.get('PROVIDER', '')
+    return {
+        'api_request_model': config.get('MODEL'),
+        'api_request_system_prompt': config.get('SYSTEM_PROMPT'),
+        'api_request_user_prompt': config.get('USER_PROMPT'),
+        'api_request_temperature': float(config.get('TEMPERATURE', 0.7)),
+        'api_request_top_p': float(config.get('TOP_P', 1.0)),
+        'api_request_stream': config.get('STREAM', 'false').lower() == 'true',
+        'api_request_response_format': _parse_json_value(response_format) if response_format.startswith('{') else {'type': response_format},
+        'api_request_provider_options': _parse_json_value(provider) if provider.startswith('{') else None
+    }
+
+def _parse_json_value(value_str):
+    """Parse a JSON config value, memoized per raw string; each call gets its own copy."""
+    return copy.deepcopy(_parse_json_value_cached(value_str))
+
+@functools.lru_cache(maxsize=128)
+def _parse_json_value_cached(value_str):
+    return json.loads(value_str)
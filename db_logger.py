@@ -5,11 +5,69 @@ Handles interaction with the PostgreSQL database for logging job and task detail
 for the openrouter-client workflows.
 """
 
+import atexit
 import configparser
+import contextlib
+import datetime
+import io
+import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+import uuid
 import psycopg2 # Or psycopg if using version 3+
+import psycopg2.extensions
 from psycopg2 import sql # For safe dynamic SQL query construction
+from psycopg2 import pool # For reusing connections across connect_db/close_db calls
+from psycopg2.extras import execute_values # For multi-row INSERTs
+from psycopg2.extras import execute_batch # For sending many UPDATEs per round-trip
+from psycopg2.extras import Json # Adapts dicts/lists straight to JSONB parameters
+from psycopg2.extras import RealDictCursor # Rows come back as plain dicts
+from psycopg2.extras import register_default_jsonb # For decoding JSONB results
 import json # For handling JSONB data types
+# orjson is optional (pip install openrouter-client[fast]); when installed it
+# serializes the large NER/comparison payloads bound to JSONB columns and
+# decodes the JSONB values read back.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_loads(data):
+    """Parse JSON text with orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+if orjson is not None:
+    register_default_jsonb(globally=True, loads=orjson.loads)
+
+# Where records go is up to the application; the command-line entry points call
+# log_to_stderr(). Failures are logged as warnings and errors, every write as DEBUG.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_LOG_LISTENER = None
+
+def log_to_stderr():
+    """
+    Send log records to stderr through a queue and a background listener thread,
+    so logging on the hot path never blocks on the terminal. Meant for entry
+    points; it installs a handler on the root logger and only runs once.
+    """
+    global _LOG_LISTENER
+    if _LOG_LISTENER is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setFormatter(logging.Formatter("%(message)s"))
+    _LOG_LISTENER = logging.handlers.QueueListener(log_queue, stderr_handler)
+    logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+    _LOG_LISTENER.start()
+    atexit.register(_LOG_LISTENER.stop)
 
 # --- Database Schema Initialization (Example - Run this manually or integrate into an init script) ---
 # It's generally better to manage schema changes with migration tools (like Alembic)
@@ -39,74 +97,445 @@ CREATE TABLE IF NOT EXISTS task_details_review (
 #     cur.execute(CREATE_REVIEW_TABLE_SQL)
 # conn.commit()
 
+# SQL that allows 'file_ref' in task_details_vlm.input_content_type when that
+# column is an enum. compare_llms logs local images as a file reference
+# ({"path", "size", "sha256"}) with this content type instead of inlining them.
+# Safe to run more than once; does nothing if the column is plain text.
+ADD_FILE_REF_CONTENT_TYPE_SQL = """
+DO $$
+DECLARE
+    content_type regtype;
+BEGIN
+    SELECT atttypid::regtype INTO content_type
+    FROM pg_attribute
+    WHERE attrelid = 'task_details_vlm'::regclass AND attname = 'input_content_type';
+    IF EXISTS (SELECT 1 FROM pg_type WHERE oid = content_type AND typtype = 'e') THEN
+        EXECUTE format('ALTER TYPE %s ADD VALUE IF NOT EXISTS %L', content_type, 'file_ref');
+    END IF;
+END $$;
+"""
+
 
 # --- Database Connection ---
 
-def connect_db(config_path="db_config.ini"):
+# Connections are pooled per config file, so connect_db/close_db pairs (one per
+# web request or background job) reuse an open session instead of paying the
+# TCP+auth handshake every time. close_db hands the connection back to its pool.
+_POOL_MINCONN = 2 # Opened up front: the web app and compare_llms each use about two at once
+# Callers check a connection out per database step, so a pool this size serves
+# many concurrent jobs and requests; kept roomy on small machines as well
+_POOL_MAXCONN = max(16, 2 * (os.cpu_count() or 1))
+_POOL_WAIT_TIMEOUT = 30 # Seconds connect_db waits for a free connection when all are checked out
+# A connection that sat idle in the pool this long is checked with SELECT 1 before
+# it is handed out, since the server may have dropped it (restart, idle timeout)
+_POOL_PING_AFTER = 5
+_POOLS = {}          # abspath(config_path) -> _BlockingConnectionPool
+_CONN_POOLS = {}     # id(conn) -> pool the connection was checked out from
+_POOLS_LOCK = threading.Lock()
+_CONFIG_CACHE = {}   # abspath(config_path) -> connection parameters read from the file
+
+class _PreparingConnection(psycopg2.extensions.connection):
     """
-    Connects to the PostgreSQL database using credentials from the config file.
+    Connection class used by the pools. Remembers which server-side prepared
+    statements exist on its session, since they live as long as the connection.
+
+    Runs in autocommit mode: every logging function issues a single statement,
+    so its conn.commit() becomes a no-op instead of a separate COMMIT round-trip.
+    begin() switches autocommit off for the duration of a transaction block.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.idle_since = None # time.monotonic() when the pool last took it back
+        self.autocommit = True
+
+class _BlockingConnectionPool(pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that makes callers wait for a free connection when all
+    maxconn are checked out, instead of failing immediately with PoolError.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=_POOL_WAIT_TIMEOUT):
+            raise pool.PoolError(f"no free connection after waiting {_POOL_WAIT_TIMEOUT}s")
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+    def _putconn(self, conn, key=None, close=False):
+        # psycopg2 closes a returned connection once minconn are idle, which would
+        # put concurrent callers back to a handshake per use; keep up to maxconn
+        # open instead. Called with the pool lock held, so the swap is not seen.
+        minconn, self.minconn = self.minconn, self.maxconn
+        try:
+            super()._putconn(conn, key, close)
+        finally:
+            self.minconn = minconn
+        if not conn.closed: # Kept for reuse
+            conn.idle_since = time.monotonic()
+
+def _execute_prepared(cur, name, sql_query, params):
+    """
+    Executes sql_query as the server-side prepared statement `name`, issuing the
+    PREPARE the first time it is used on a connection, so repeated logging calls
+    skip parse and plan. Connections not created by connect_db run it directly.
 
     Args:
-        config_path (str): Path to the database configuration file.
+        cur: Cursor to execute on.
+        name (str): Prepared statement name, unique per SQL text.
+        sql_query (str): Statement using %s placeholders.
+        params (tuple): Parameter values, one per placeholder.
+    """
+    prepared = getattr(cur.connection, 'prepared_statements', None)
+    if prepared is None:
+        cur.execute(sql_query, params)
+        return
+    if name not in prepared:
+        parts = sql_query.strip().rstrip(';').split('%s')
+        numbered = parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+        cur.execute(f"PREPARE {name} AS {numbered};")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", params)
+
+def _read_db_config(config_path):
+    """
+    Reads the [postgresql] connection parameters from the database config file.
+    The file does not change while the process runs, so it is parsed once per path
+    and later calls (e.g. reconnecting after the server was unreachable) reuse the result.
 
     Returns:
-        psycopg2.connection: The database connection object, or None if connection fails.
+        dict: Keyword arguments for psycopg2.connect, or None if the config is missing or invalid.
     """
+    cache_key = os.path.abspath(config_path)
+    db_params = _CONFIG_CACHE.get(cache_key)
+    if db_params is not None:
+        return db_params
+
     config = configparser.ConfigParser()
     if not config.read(config_path):
-        print(f"Error: Database configuration file '{config_path}' not found or empty.", file=sys.stderr)
+        logger.error("Error: Database configuration file '%s' not found or empty.", config_path)
         return None
 
     try:
         db_config = config['postgresql']
-        conn = psycopg2.connect(
-            dbname=db_config.get('dbname'),
-            user=db_config.get('user'),
-            password=db_config.get('password'),
-            host=db_config.get('host', 'localhost'), # Default host if not specified
-            port=db_config.getint('port', 5432)      # Default port if not specified
+        db_params = {
+            'dbname': db_config.get('dbname'),
+            'user': db_config.get('user'),
+            'password': db_config.get('password'),
+            'host': db_config.get('host', 'localhost'), # Default host if not specified
+            'port': db_config.getint('port', 5432),     # Default port if not specified
+            # Names the sessions in pg_stat_activity
+            'application_name': db_config.get('application_name', 'openrouter-client'),
+            # Pooled connections sit idle between jobs; TCP keepalives stop NAT/firewall
+            # timeouts from silently dropping them, so they don't have to be reopened
+            'keepalives': 1,
+            'keepalives_idle': db_config.getint('keepalives_idle', 30),
+        }
+        # The server's synchronous_commit setting applies unless the config overrides it.
+        # With 'off', COMMIT returns without waiting for the WAL flush: a crash can drop
+        # the last few hundred milliseconds of log rows, but never leaves them inconsistent.
+        synchronous_commit = db_config.get('synchronous_commit')
+        if synchronous_commit:
+            db_params['options'] = f"-c synchronous_commit={synchronous_commit}"
+    except (KeyError, ValueError) as error:
+        logger.error("Error reading database configuration file '%s': %s", config_path, error)
+        return None
+    _CONFIG_CACHE[cache_key] = db_params
+    return db_params
+
+def _create_pool(config_path):
+    """
+    Creates a connection pool from the database config file.
+
+    Returns:
+        _BlockingConnectionPool: The pool, or None if the config is missing or invalid.
+    """
+    db_params = _read_db_config(config_path)
+    if db_params is None:
+        return None
+
+    try:
+        db_pool = _BlockingConnectionPool(
+            _POOL_MINCONN,
+            _POOL_MAXCONN,
+            connection_factory=_PreparingConnection,
+            **db_params
         )
-        print(f"Successfully connected to database '{db_config.get('dbname')}' on {db_config.get('host', 'localhost')}.")
+        logger.debug("Successfully connected to database '%s' on %s.", db_params['dbname'], db_params['host'])
+        return db_pool
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error("Error connecting to PostgreSQL database: %s", error)
+        return None
+
+def _checkout(db_pool):
+    """
+    Takes a working connection from db_pool. Connections that are closed, or that
+    fail a SELECT 1 after sitting idle, are discarded and the next one is tried.
+
+    Returns:
+        psycopg2.connection: A connection that answered (or has just been opened).
+    """
+    for _ in range(_POOL_MAXCONN + 1):
+        conn = db_pool.getconn() # The pool is thread-safe; may open a new connection or wait for a free one
+        idle_since = getattr(conn, 'idle_since', None)
+        if not conn.closed:
+            if idle_since is None or time.monotonic() - idle_since < _POOL_PING_AFTER:
+                return conn
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                return conn
+            except (Exception, psycopg2.DatabaseError) as error:
+                logger.warning("Discarding broken pooled connection: %s", error)
+        db_pool.putconn(conn, close=True)
+    raise pool.PoolError("no working connection available")
+
+def connect_db(config_path="db_config.ini"):
+    """
+    Connects to the PostgreSQL database using credentials from the config file.
+    Connections come from a pool shared by all callers using the same config file;
+    release them with close_db().
+
+    Args:
+        config_path (str): Path to the database configuration file.
+
+    Returns:
+        psycopg2.connection: The database connection object, or None if connection fails.
+    """
+    pool_key = os.path.abspath(config_path)
+    try:
+        with _POOLS_LOCK:
+            db_pool = _POOLS.get(pool_key)
+            if db_pool is None:
+                db_pool = _create_pool(config_path)
+                if db_pool is None:
+                    return None
+                _POOLS[pool_key] = db_pool
+        conn = _checkout(db_pool)
+        with _POOLS_LOCK:
+            _CONN_POOLS[id(conn)] = db_pool
         return conn
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error connecting to PostgreSQL database: {error}", file=sys.stderr)
+        logger.error("Error connecting to PostgreSQL database: %s", error)
         return None
 
 def close_db(conn):
-    """Closes the database connection."""
+    """Releases the database connection back to its pool (or closes it if it was not pooled)."""
     if conn is not None:
-        conn.close()
-        print("Database connection closed.")
+        with _POOLS_LOCK:
+            db_pool = _CONN_POOLS.pop(id(conn), None)
+        if db_pool is None:
+            conn.close()
+            logger.debug("Database connection closed.")
+            return
+        try:
+            db_pool.putconn(conn) # Rolls back any open transaction; discards closed connections
+            logger.debug("Database connection returned to pool.")
+        except (Exception, psycopg2.DatabaseError) as error:
+            logger.error("Error returning connection to pool: %s", error)
+            conn.close()
+
+@contextlib.contextmanager
+def connection(config_path="db_config.ini"):
+    """
+    Checks a pooled connection out for the duration of a with block and returns it afterwards.
+
+    Usage:
+        with db_logger.connection(db_config_path) as conn:
+            if conn is None:
+                ...  # connection failed
+            job = db_logger.get_job_status(conn, job_id)
+
+    Args:
+        config_path (str): Path to the database configuration file.
+
+    Yields:
+        psycopg2.connection: The database connection object, or None if connection fails.
+    """
+    conn = connect_db(config_path)
+    try:
+        yield conn
+    finally:
+        close_db(conn)
+
+def close_all_pools():
+    """Closes every pooled connection. Registered to run at interpreter exit."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+        _CONN_POOLS.clear()
+    for db_pool in pools:
+        db_pool.closeall()
+
+atexit.register(close_all_pools)
+
+# --- Transactions ---
+
+_SAVEPOINT_SQL = "SAVEPOINT db_logger_step; "
+
+class _TransactionConnection:
+    """
+    Connection wrapper handed out by begin(). The logging functions below call
+    commit() or rollback() after every statement; inside a transaction block these
+    become savepoint operations, so a failed call still undoes only its own work
+    while the whole block is committed once on exit.
+
+    The savepoint is not sent on its own: it is queued and sent in the same
+    query string as the next statement, so each logging call in a block costs
+    one round-trip rather than two, and the last one is dropped by the COMMIT.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._savepoint_pending = False
+
+    def _take_savepoint(self):
+        """Return the queued SAVEPOINT to prefix onto the next statement (or '')."""
+        if not self._savepoint_pending:
+            return ''
+        self._savepoint_pending = False
+        return _SAVEPOINT_SQL
+
+    def cursor(self, *args, **kwargs):
+        return _TransactionCursor(self, self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        self._savepoint_pending = True
+
+    def rollback(self):
+        if self._savepoint_pending:
+            return # Nothing was sent since the last savepoint, so there is nothing to undo
+        with self._conn.cursor() as cur:
+            cur.execute("ROLLBACK TO SAVEPOINT db_logger_step;")
+
+class _TransactionCursor:
+    """Cursor proxy that sends the transaction's queued savepoint along with the next statement."""
+
+    def __init__(self, tx, cur):
+        self._tx = tx
+        self._cur = cur
+
+    def execute(self, query, vars=None):
+        prefix = self._tx._take_savepoint()
+        if prefix:
+            if isinstance(query, bytes): # execute_values sends pre-rendered bytes
+                query = prefix.encode(psycopg2.extensions.encodings[self._cur.connection.encoding]) + query
+            else:
+                if not isinstance(query, str):
+                    query = query.as_string(self._cur)
+                query = prefix + query
+        try:
+            return self._cur.execute(query, vars)
+        except BaseException:
+            # A failure before anything was sent (e.g. a parameter that cannot be
+            # adapted) leaves the transaction status as it was. The savepoint was
+            # not set then, so it stays queued and rollback() has nothing to undo.
+            if prefix and self._cur.connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                self._tx._savepoint_pending = True
+            raise
+
+    def copy_expert(self, *args, **kwargs):
+        prefix = self._tx._take_savepoint()
+        if prefix:
+            self._cur.execute(prefix) # COPY must be the only statement in its query
+        return self._cur.copy_expert(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._cur.__exit__(*exc_info)
+
+@contextlib.contextmanager
+def begin(conn):
+    """
+    Groups several logging calls into a single transaction, committed once on exit.
+
+    Usage:
+        with db_logger.begin(conn) as tx:
+            task_id = db_logger.create_task(tx, job_id, 1, 'vlm_extraction')
+            db_logger.log_vlm_details(tx, task_id, details)
+
+    Args:
+        conn: Database connection object.
+
+    Yields:
+        Connection wrapper to pass to the logging functions inside the block.
+
+    Raises:
+        psycopg2.DatabaseError: If the final COMMIT fails (after rolling back), so
+            callers never go on with ids that were not stored.
+    """
+    tx = _TransactionConnection(conn)
+    autocommit = conn.autocommit
+    conn.autocommit = False # Pooled connections autocommit single statements; a block needs a real transaction
+    try:
+        try:
+            tx.commit() # Initial savepoint (sent with the first statement), so the first call can roll back alone
+            yield tx
+        except BaseException:
+            conn.rollback()
+            raise
+        try:
+            conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            logger.error("Error committing transaction: %s", error)
+            conn.rollback()
+            raise
+    finally:
+        if not conn.closed:
+            conn.autocommit = autocommit
 
 # --- Job Logging ---
 
-def create_job(conn, workflow_name, input_source):
+# Statuses that end a job or task; updating to one of them stamps end_time
+_FINAL_STATUSES = ('completed', 'failed')
+
+def create_job(conn, workflow_name, input_source, job_id=None):
     """
     Creates a new job record in the 'jobs' table.
+    The UUID is generated client-side, so the INSERT has no result to wait for.
 
     Args:
         conn: Database connection object.
         workflow_name (str): Name of the workflow being run (e.g., 'compare_llms').
         input_source (str): The original input file/URL for the job.
+        job_id (str, optional): UUID to use for the job; a new one is generated if omitted.
 
     Returns:
         str: The UUID of the newly created job, or None if creation fails.
     """
-    job_id = None
+    if job_id is None:
+        job_id = str(uuid.uuid4())
     sql_query = """
-        INSERT INTO jobs (workflow_name, input_source, status)
-        VALUES (%s, %s, 'started')
-        RETURNING job_id;
+        INSERT INTO jobs (job_id, workflow_name, input_source, status)
+        VALUES (%s, %s, %s, 'started');
     """
     try:
         with conn.cursor() as cur:
-            cur.execute(sql_query, (workflow_name, input_source))
-            job_id = cur.fetchone()[0]
+            _execute_prepared(cur, 'db_logger_create_job', sql_query, (job_id, workflow_name, input_source))
             conn.commit()
-            print(f"Created job record with ID: {job_id}")
+            logger.debug("Created job record with ID: %s", job_id)
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error creating job record: {error}", file=sys.stderr)
+        logger.error("Error creating job record: %s", error)
         conn.rollback() # Roll back the transaction on error
+        return None
     return job_id
 
 def update_job_status(conn, job_id, status, error_message=None):
@@ -122,49 +551,52 @@ def update_job_status(conn, job_id, status, error_message=None):
     sql_query = """
         UPDATE jobs
         SET status = %s,
-            end_time = CASE WHEN %s IN ('completed', 'failed') THEN NOW() ELSE end_time END,
+            end_time = CASE WHEN %s THEN NOW() ELSE end_time END,
             error_message = %s
         WHERE job_id = %s;
     """
     try:
         with conn.cursor() as cur:
-            cur.execute(sql_query, (status, status, error_message, job_id))
+            _execute_prepared(cur, 'db_logger_update_job_status', sql_query,
+                              (status, status in _FINAL_STATUSES, error_message, job_id))
             conn.commit()
-            print(f"Updated job {job_id} status to: {status}")
+            logger.debug("Updated job %s status to: %s", job_id, status)
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error updating job status for {job_id}: {error}", file=sys.stderr)
+        logger.error("Error updating job status for %s: %s", job_id, error)
         conn.rollback()
 
 # --- Task Logging ---
 
-def create_task(conn, job_id, task_order, task_type):
+def create_task(conn, job_id, task_order, task_type, task_id=None):
     """
     Creates a new task record in the 'tasks' table.
+    The UUID is generated client-side, so the INSERT has no result to wait for.
 
     Args:
         conn: Database connection object.
         job_id (str): UUID of the parent job.
         task_order (int): Sequence number of the task within the job.
         task_type (str): Type of the task ('vlm_extraction', 'ner_processing', 'json_comparison').
+        task_id (str, optional): UUID to use for the task; a new one is generated if omitted.
 
     Returns:
         str: The UUID of the newly created task, or None if creation fails.
     """
-    task_id = None
+    if task_id is None:
+        task_id = str(uuid.uuid4())
     sql_query = """
-        INSERT INTO tasks (job_id, task_order, task_type, status)
-        VALUES (%s, %s, %s, 'pending')
-        RETURNING task_id;
+        INSERT INTO tasks (task_id, job_id, task_order, task_type, status)
+        VALUES (%s, %s, %s, %s, 'pending');
     """
     try:
         with conn.cursor() as cur:
-            cur.execute(sql_query, (job_id, task_order, task_type))
-            task_id = cur.fetchone()[0]
+            _execute_prepared(cur, 'db_logger_create_task', sql_query, (task_id, job_id, task_order, task_type))
             conn.commit()
-            print(f"Created task record {task_order} ({task_type}) with ID: {task_id} for job {job_id}")
+            logger.debug("Created task record %s (%s) with ID: %s for job %s", task_order, task_type, task_id, job_id)
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error creating task record for job {job_id}: {error}", file=sys.stderr)
+        logger.error("Error creating task record for job %s: %s", job_id, error)
         conn.rollback()
+        return None
     return task_id
 
 def update_task_status(conn, task_id, status, error_message=None):
@@ -180,67 +612,184 @@ def update_task_status(conn, task_id, status, error_message=None):
     sql_query = """
         UPDATE tasks
         SET status = %s,
-            start_time = CASE WHEN %s = 'running' AND start_time IS NULL THEN NOW() ELSE start_time END,
-            end_time = CASE WHEN %s IN ('completed', 'failed') THEN NOW() ELSE end_time END,
+            start_time = CASE WHEN %s AND start_time IS NULL THEN NOW() ELSE start_time END,
+            end_time = CASE WHEN %s THEN NOW() ELSE end_time END,
             error_message = %s
         WHERE task_id = %s;
     """
     try:
         with conn.cursor() as cur:
-            cur.execute(sql_query, (status, status, status, error_message, task_id))
+            _execute_prepared(cur, 'db_logger_update_task_status', sql_query,
+                              (status, status == 'running', status in _FINAL_STATUSES, error_message, task_id))
             conn.commit()
-            print(f"Updated task {task_id} status to: {status}")
+            logger.debug("Updated task %s status to: %s", task_id, status)
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error updating task status for {task_id}: {error}", file=sys.stderr)
+        logger.error("Error updating task status for %s: %s", task_id, error)
         conn.rollback()
 
-# --- Task Detail Logging ---
+def complete_task(conn, task_id, status, start_time, error_message=None):
+    """
+    Records a finished task in a single UPDATE, setting its final status together
+    with the start time captured by the caller when the task was dispatched. Saves
+    the separate 'running' update for callers that don't need the task to show as
+    running in the meantime. The end time is set to the time of the update.
 
-# Placeholder functions for logging details - implementation needed
-# These would construct INSERT statements for the respective task_details_* tables
+    Args:
+        conn: Database connection object.
+        task_id (str): UUID of the task to update.
+        status (str): Final status ('completed' or 'failed').
+        start_time (datetime.datetime): When the task started (timezone-aware).
+        error_message (str, optional): Error details if status is 'failed'.
+    """
+    sql_query = """
+        UPDATE tasks
+        SET status = %s,
+            start_time = %s,
+            end_time = NOW(),
+            error_message = %s
+        WHERE task_id = %s;
+    """
+    try:
+        with conn.cursor() as cur:
+            _execute_prepared(cur, 'db_logger_complete_task', sql_query, (status, start_time, error_message, task_id))
+            conn.commit()
+            logger.debug("Completed task %s with status: %s", task_id, status)
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error("Error completing task %s: %s", task_id, error)
+        conn.rollback()
 
-def log_vlm_details(conn, task_id, details_dict):
+def create_tasks_bulk(conn, job_id, tasks):
     """
-    Logs details specific to a VLM extraction task into the task_details_vlm table.
+    Creates several task records for a job with multi-row INSERTs and a single commit.
 
     Args:
         conn: Database connection object.
-        task_id (str): UUID of the task.
-        details_dict (dict): Dictionary containing VLM task details, e.g.:
-            {
-                'input_source': 'path/or/url',
-                'input_content_type': 'image_base64' | 'pdf_base64' | 'text' | 'url',
-                'input_content': 'base64_string_or_text_or_url',
-                'api_request_model': 'model_name',
-                'api_request_system_prompt': 'prompt text',
-                'api_request_user_prompt': 'prompt text',
-                'api_request_temperature': 0.7,
-                'api_request_top_p': 1.0,
-                'api_request_stream': False,
-                'api_request_response_format': {'type': 'text'}, # JSONB
-                'api_request_provider_options': {'option': 'value'} # JSONB
-            }
+        job_id (str): UUID of the parent job.
+        tasks (list): (task_order, task_type) pairs; see create_task.
+
+    Returns:
+        list: UUIDs of the new tasks, in the order given, or None if creation fails.
+    """
+    if len(tasks) > _BULK_PAGE_SIZE and getattr(conn, 'autocommit', False):
+        # Several INSERT pages must still commit (or fail) together
+        try:
+            with begin(conn) as tx:
+                return create_tasks_bulk(tx, job_id, tasks)
+        except (Exception, psycopg2.DatabaseError):
+            return None # begin() has logged the failed commit
+    rows = [(str(uuid.uuid4()), job_id, task_order, task_type) for task_order, task_type in tasks]
+    if not rows:
+        return []
+    sql_query = "INSERT INTO tasks (task_id, job_id, task_order, task_type, status) VALUES %s;"
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, sql_query, rows, template="(%s, %s, %s, %s, 'pending')", page_size=_BULK_PAGE_SIZE)
+            conn.commit()
+            logger.debug("Created %s task records for job %s", len(rows), job_id)
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error("Error creating task records for job %s: %s", job_id, error)
+        conn.rollback()
+        return None
+    return [row[0] for row in rows]
+
+def update_task_status_bulk(conn, updates):
     """
+    Updates the status of several tasks, sending a page of UPDATEs per round-trip, with a single commit.
+
+    Args:
+        conn: Database connection object.
+        updates (list): (task_id, status, error_message) tuples; see update_task_status.
+    """
+    if not updates:
+        return
+    if len(updates) > _BULK_PAGE_SIZE and getattr(conn, 'autocommit', False):
+        # Several pages must still commit (or fail) together
+        try:
+            with begin(conn) as tx:
+                update_task_status_bulk(tx, updates)
+        except (Exception, psycopg2.DatabaseError):
+            pass # begin() has logged the failed commit
+        return
     sql_query = """
-        INSERT INTO task_details_vlm (
-            task_id, input_source, input_content_type, input_content,
-            api_request_model, api_request_system_prompt, api_request_user_prompt,
-            api_request_temperature, api_request_top_p, api_request_stream,
-            api_request_response_format, api_request_provider_options
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+        UPDATE tasks
+        SET status = %s,
+            start_time = CASE WHEN %s AND start_time IS NULL THEN NOW() ELSE start_time END,
+            end_time = CASE WHEN %s THEN NOW() ELSE end_time END,
+            error_message = %s
+        WHERE task_id = %s;
     """
-    # Prepare data tuple, using .get() for optional fields to default to None if missing
-    # Convert JSONB fields to JSON strings if they are dicts/lists
-    response_format_json = None
-    if isinstance(details_dict.get('api_request_response_format'), (dict, list)):
-        response_format_json = json.dumps(details_dict['api_request_response_format'])
+    rows = [(status, status == 'running', status in _FINAL_STATUSES, error_message, task_id)
+            for task_id, status, error_message in updates]
+    try:
+        with conn.cursor() as cur:
+            execute_batch(cur, sql_query, rows, page_size=_BULK_PAGE_SIZE)
+            conn.commit()
+            logger.debug("Updated status of %s tasks", len(rows))
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error("Error updating status of %s tasks: %s", len(rows), error)
+        conn.rollback()
 
-    provider_options_json = None
-    if isinstance(details_dict.get('api_request_provider_options'), (dict, list)):
-        provider_options_json = json.dumps(details_dict['api_request_provider_options'])
+# --- Task Detail Logging ---
 
-    data = (
+# Placeholder functions for logging details - implementation needed
+# These would construct INSERT statements for the respective task_details_* tables
+
+# Rows per multi-row INSERT statement sent by the *_bulk functions
+_BULK_PAGE_SIZE = 500
+# Batches at least this large are streamed with COPY FROM STDIN instead, which
+# skips per-statement parsing entirely and is the fastest way to load many rows
+_COPY_THRESHOLD = 1000
+# Escapes for COPY's text format; None is sent as \N
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Columns of each task_details_* table after task_id, in row-tuple order
+_VLM_DETAILS_COLUMNS = (
+    'input_source', 'input_content_type', 'input_content',
+    'api_request_model', 'api_request_system_prompt', 'api_request_user_prompt',
+    'api_request_temperature', 'api_request_top_p', 'api_request_stream',
+    'api_request_response_format', 'api_request_provider_options'
+)
+_NER_DETAILS_COLUMNS = (
+    'input_text',
+    'api_request_model', 'api_request_system_prompt', 'api_request_user_prompt',
+    'api_request_temperature', 'api_request_top_p', 'api_request_stream',
+    'api_request_response_format', 'api_request_provider_options'
+)
+_COMPARISON_DETAILS_COLUMNS = ('input_json_path1', 'input_json_path2')
+
+def _dumps_jsonb(obj):
+    """Serialize a value for a JSONB parameter, with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj)
+
+def _json_column(value):
+    """Adapt a dict/list for a JSONB column; anything else is stored as NULL."""
+    if isinstance(value, (dict, list)):
+        return Json(value, dumps=_dumps_jsonb)
+    return None
+
+def _json_output(value):
+    """Adapt a task output for a JSONB column; strings are assumed to be JSON text already."""
+    if isinstance(value, str):
+        return value
+    return _json_column(value)
+
+def _decode_json_column(value):
+    """Return a JSONB value read back from the database as Python data, decoding it if it arrived as text."""
+    if isinstance(value, (str, bytes)):
+        return _json_loads(value)
+    return value
+
+def _tasks_label(rows):
+    """Describe the tasks in a bulk insert for log messages."""
+    if len(rows) == 1:
+        return f"task {rows[0][0]}"
+    return f"{len(rows)} tasks"
+
+def _vlm_details_row(task_id, details_dict):
+    """Build the task_details_vlm row tuple, using .get() for optional fields."""
+    return (
         task_id,
         details_dict.get('input_source'),
         details_dict.get('input_content_type'),
@@ -251,19 +800,162 @@ def log_vlm_details(conn, task_id, details_dict):
         details_dict.get('api_request_temperature'),
         details_dict.get('api_request_top_p'),
         details_dict.get('api_request_stream'),
-        response_format_json,
-        provider_options_json
+        _json_column(details_dict.get('api_request_response_format')),
+        _json_column(details_dict.get('api_request_provider_options'))
+    )
+
+def _ner_details_row(task_id, details_dict):
+    """Build the task_details_ner row tuple, using .get() for optional fields."""
+    return (
+        task_id,
+        details_dict.get('input_text'),
+        details_dict.get('api_request_model'),
+        details_dict.get('api_request_system_prompt'),
+        details_dict.get('api_request_user_prompt'),
+        details_dict.get('api_request_temperature'),
+        details_dict.get('api_request_top_p'),
+        details_dict.get('api_request_stream'),
+        _json_column(details_dict.get('api_request_response_format')),
+        _json_column(details_dict.get('api_request_provider_options'))
+    )
+
+def _comparison_details_row(task_id, details_dict):
+    """Build the task_details_comparison row tuple."""
+    return (
+        task_id,
+        details_dict.get('input_json_path1'),
+        details_dict.get('input_json_path2')
+    )
+
+def _copy_text(value):
+    """Format one value as a field of COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, Json):
+        value = value.dumps(value.adapted)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    return str(value).translate(_COPY_ESCAPES)
+
+class _CopyRowStream(io.TextIOBase):
+    """
+    Read-only file object for copy_expert that formats rows as COPY text lines
+    only as they are read, so an iterator of rows is streamed to the server
+    without building the whole payload in memory first.
+    """
+
+    def __init__(self, rows):
+        self._lines = ('\t'.join(map(_copy_text, row)) + '\n' for row in rows)
+        self._pending = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._pending]
+        length = len(self._pending)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size is None or size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+def _copy_rows(cur, table, columns, rows):
+    """Stream rows into table with a single COPY FROM STDIN."""
+    data = _CopyRowStream(rows)
+    copy_query = sql.SQL("COPY {table} ({columns}) FROM STDIN").format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns))
     )
+    cur.copy_expert(copy_query.as_string(cur.connection), data)
+
+def _insert_rows(conn, table, columns, rows, label):
+    """
+    Insert rows with one multi-row INSERT per page (or one COPY for large batches) and a single commit.
 
+    Args:
+        conn: Database connection object.
+        table (str): Name of the task_details_* table.
+        columns (tuple): Details columns after task_id.
+        rows (list): Row tuples; the first element of each is the task_id.
+        label (str): Kind of details being logged, used in messages (e.g., 'VLM').
+    """
+    if not rows:
+        return
+    if len(rows) > _BULK_PAGE_SIZE and getattr(conn, 'autocommit', False):
+        # Several INSERT pages must still commit (or fail) together
+        try:
+            with begin(conn) as tx:
+                _insert_rows(tx, table, columns, rows, label)
+        except (Exception, psycopg2.DatabaseError):
+            pass # begin() has logged the failed commit
+        return
+    columns = ('task_id',) + tuple(columns)
     try:
         with conn.cursor() as cur:
-            cur.execute(sql_query, data)
+            if len(rows) >= _COPY_THRESHOLD:
+                _copy_rows(cur, table, columns, rows)
+            elif len(rows) == 1:
+                # The common single-task case runs as a prepared statement
+                insert_query = sql.SQL("INSERT INTO {table} ({columns}) VALUES ({placeholders})").format(
+                    table=sql.Identifier(table),
+                    columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+                    placeholders=sql.SQL(', ').join(sql.Placeholder() * len(columns))
+                )
+                _execute_prepared(cur, f"db_logger_insert_{table}", insert_query.as_string(cur.connection), rows[0])
+            else:
+                insert_query = sql.SQL("INSERT INTO {table} ({columns}) VALUES %s").format(
+                    table=sql.Identifier(table),
+                    columns=sql.SQL(', ').join(map(sql.Identifier, columns))
+                )
+                execute_values(cur, insert_query.as_string(cur.connection), rows, page_size=_BULK_PAGE_SIZE)
             conn.commit()
-            print(f"Logged VLM details for task {task_id}")
+            logger.debug("Logged %s details for %s", label, _tasks_label(rows))
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error logging VLM details for task {task_id}: {error}", file=sys.stderr)
+        logger.error("Error logging %s details for %s: %s", label, _tasks_label(rows), error)
         conn.rollback()
 
+def log_vlm_details(conn, task_id, details_dict):
+    """
+    Logs details specific to a VLM extraction task into the task_details_vlm table.
+
+    Args:
+        conn: Database connection object.
+        task_id (str): UUID of the task.
+        details_dict (dict): Dictionary containing VLM task details, e.g.:
+            {
+                'input_source': 'path/or/url',
+                'input_content_type': 'image_base64' | 'pdf_base64' | 'text' | 'url' | 'file_ref',
+                'input_content': 'base64_string_or_text_or_url_or_file_ref_json',
+                'api_request_model': 'model_name',
+                'api_request_system_prompt': 'prompt text',
+                'api_request_user_prompt': 'prompt text',
+                'api_request_temperature': 0.7,
+                'api_request_top_p': 1.0,
+                'api_request_stream': False,
+                'api_request_response_format': {'type': 'text'}, # JSONB
+                'api_request_provider_options': {'option': 'value'} # JSONB
+            }
+    """
+    log_vlm_details_bulk(conn, [(task_id, details_dict)])
+
+def log_vlm_details_bulk(conn, task_details):
+    """
+    Logs VLM details for many tasks with multi-row INSERTs (COPY for large batches) and a single commit.
+
+    Args:
+        conn: Database connection object.
+        task_details (list): (task_id, details_dict) pairs; see log_vlm_details for the dict keys.
+    """
+    rows = [_vlm_details_row(task_id, details_dict) for task_id, details_dict in task_details]
+    _insert_rows(conn, 'task_details_vlm', _VLM_DETAILS_COLUMNS, rows, 'VLM')
+
 
 def log_ner_details(conn, task_id, details_dict):
     """
@@ -285,45 +977,18 @@ def log_ner_details(conn, task_id, details_dict):
                 'api_request_provider_options': {'option': 'value'} # JSONB
             }
     """
-    sql_query = """
-        INSERT INTO task_details_ner (
-            task_id, input_text,
-            api_request_model, api_request_system_prompt, api_request_user_prompt,
-            api_request_temperature, api_request_top_p, api_request_stream,
-            api_request_response_format, api_request_provider_options
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-    """
-    # Prepare data tuple, using .get() for optional fields
-    response_format_json = None
-    if isinstance(details_dict.get('api_request_response_format'), (dict, list)):
-        response_format_json = json.dumps(details_dict['api_request_response_format'])
+    log_ner_details_bulk(conn, [(task_id, details_dict)])
 
-    provider_options_json = None
-    if isinstance(details_dict.get('api_request_provider_options'), (dict, list)):
-        provider_options_json = json.dumps(details_dict['api_request_provider_options'])
-
-    data = (
-        task_id,
-        details_dict.get('input_text'),
-        details_dict.get('api_request_model'),
-        details_dict.get('api_request_system_prompt'),
-        details_dict.get('api_request_user_prompt'),
-        details_dict.get('api_request_temperature'),
-        details_dict.get('api_request_top_p'),
-        details_dict.get('api_request_stream'),
-        response_format_json,
-        provider_options_json
-    )
+def log_ner_details_bulk(conn, task_details):
+    """
+    Logs NER details for many tasks with multi-row INSERTs (COPY for large batches) and a single commit.
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql_query, data)
-            conn.commit()
-            print(f"Logged NER details for task {task_id}")
-    except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error logging NER details for task {task_id}: {error}", file=sys.stderr)
-        conn.rollback()
+    Args:
+        conn: Database connection object.
+        task_details (list): (task_id, details_dict) pairs; see log_ner_details for the dict keys.
+    """
+    rows = [_ner_details_row(task_id, details_dict) for task_id, details_dict in task_details]
+    _insert_rows(conn, 'task_details_ner', _NER_DETAILS_COLUMNS, rows, 'NER')
 
 def log_comparison_details(conn, task_id, details_dict):
     """
@@ -338,24 +1003,145 @@ def log_comparison_details(conn, task_id, details_dict):
                 'input_json_path2': 'path/to/ner2_output.json'
             }
     """
-    sql_query = """
-        INSERT INTO task_details_comparison (task_id, input_json_path1, input_json_path2)
-        VALUES (%s, %s, %s);
+    log_comparison_details_bulk(conn, [(task_id, details_dict)])
+
+def log_comparison_details_bulk(conn, task_details):
     """
-    data = (
-        task_id,
-        details_dict.get('input_json_path1'),
-        details_dict.get('input_json_path2')
-    )
+    Logs Comparison details for many tasks with multi-row INSERTs (COPY for large batches) and a single commit.
+
+    Args:
+        conn: Database connection object.
+        task_details (list): (task_id, details_dict) pairs; see log_comparison_details for the dict keys.
+    """
+    rows = [_comparison_details_row(task_id, details_dict) for task_id, details_dict in task_details]
+    _insert_rows(conn, 'task_details_comparison', _COMPARISON_DETAILS_COLUMNS, rows, 'Comparison')
+
+
+# --- Task Creation With Details ---
+# A writable CTE inserts the task and its details row in one statement, saving
+# the round-trip between create_task() and log_*_details(). The task_id is
+# generated client-side, so the details row can reference it directly.
+
+def _create_task_with_details(conn, job_id, task_order, task_type, details_table, details_columns, details_values, label):
+    """
+    Creates a task record and its task_details_* row in a single statement.
 
+    Args:
+        conn: Database connection object.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        task_type (str): Type of the task ('vlm_extraction', 'ner_processing', 'json_comparison').
+        details_table (str): Name of the task_details_* table.
+        details_columns (tuple): Details columns after task_id.
+        details_values (tuple): Values for details_columns.
+        label (str): Kind of details being logged, used in messages (e.g., 'VLM').
+
+    Returns:
+        str: The UUID of the newly created task, or None if creation fails.
+    """
+    task_id = str(uuid.uuid4())
+    sql_query = sql.SQL("""
+        WITH new_task AS (
+            INSERT INTO tasks (task_id, job_id, task_order, task_type, status)
+            VALUES (%s, %s, %s, %s, 'pending')
+        )
+        INSERT INTO {table} (task_id, {columns})
+        VALUES (%s, {placeholders});
+    """).format(
+        table=sql.Identifier(details_table),
+        columns=sql.SQL(', ').join(map(sql.Identifier, details_columns)),
+        placeholders=sql.SQL(', ').join(sql.Placeholder() * len(details_columns))
+    )
     try:
         with conn.cursor() as cur:
-            cur.execute(sql_query, data)
+            _execute_prepared(cur, f"db_logger_create_task_{details_table}", sql_query.as_string(cur.connection),
+                              (task_id, job_id, task_order, task_type, task_id) + tuple(details_values))
             conn.commit()
-            print(f"Logged Comparison details for task {task_id}")
+            logger.debug("Created task record %s (%s) with ID: %s for job %s", task_order, task_type, task_id, job_id)
+            logger.debug("Logged %s details for task %s", label, task_id)
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error logging Comparison details for task {task_id}: {error}", file=sys.stderr)
+        logger.error("Error creating task record with %s details for job %s: %s", label, job_id, error)
         conn.rollback()
+        return None
+    return task_id
+
+def create_task_with_vlm_details(conn, job_id, task_order, details_dict):
+    """
+    Creates a 'vlm_extraction' task and logs its details in one round-trip.
+
+    Args:
+        conn: Database connection object.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        details_dict (dict): VLM task details; see log_vlm_details for the keys.
+
+    Returns:
+        str: The UUID of the newly created task, or None if creation fails.
+    """
+    return _create_task_with_details(conn, job_id, task_order, 'vlm_extraction', 'task_details_vlm',
+                                     _VLM_DETAILS_COLUMNS, _vlm_details_row(None, details_dict)[1:], 'VLM')
+
+def create_task_with_ner_details(conn, job_id, task_order, details_dict):
+    """
+    Creates an 'ner_processing' task and logs its details in one round-trip.
+
+    Args:
+        conn: Database connection object.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        details_dict (dict): NER task details; see log_ner_details for the keys.
+
+    Returns:
+        str: The UUID of the newly created task, or None if creation fails.
+    """
+    return _create_task_with_details(conn, job_id, task_order, 'ner_processing', 'task_details_ner',
+                                     _NER_DETAILS_COLUMNS, _ner_details_row(None, details_dict)[1:], 'NER')
+
+def create_task_with_comparison_details(conn, job_id, task_order, details_dict):
+    """
+    Creates a 'json_comparison' task and logs its details in one round-trip.
+
+    Args:
+        conn: Database connection object.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        details_dict (dict): Comparison task details; see log_comparison_details for the keys.
+
+    Returns:
+        str: The UUID of the newly created task, or None if creation fails.
+    """
+    return _create_task_with_details(conn, job_id, task_order, 'json_comparison', 'task_details_comparison',
+                                     _COMPARISON_DETAILS_COLUMNS, _comparison_details_row(None, details_dict)[1:], 'Comparison')
+
+# task_type -> create_task_with_*_details function for that type's details table
+_CREATE_TASK_WITH_DETAILS = {
+    'vlm_extraction': create_task_with_vlm_details,
+    'ner_processing': create_task_with_ner_details,
+    'json_comparison': create_task_with_comparison_details,
+}
+
+def create_task_with_details(conn, job_id, task_order, task_type, details_dict):
+    """
+    Creates a task and logs its details in one round-trip, choosing the details
+    table from task_type. Without details (e.g. they could not be prepared), or for
+    task types without a task_details_* table here, only the task is created.
+
+    Args:
+        conn: Database connection object.
+        job_id (str): UUID of the parent job.
+        task_order (int): Sequence number of the task within the job.
+        task_type (str): Type of the task ('vlm_extraction', 'ner_processing', 'json_comparison').
+        details_dict (dict): Task details (see the matching log_*_details function), or None.
+
+    Returns:
+        str: The UUID of the newly created task, or None if creation fails.
+    """
+    create_with_details = _CREATE_TASK_WITH_DETAILS.get(task_type)
+    if details_dict is None or create_with_details is None:
+        if details_dict is not None:
+            logger.warning("No details table for task_type '%s'; creating task %s without details", task_type, task_order)
+        return create_task(conn, job_id, task_order, task_type)
+    return create_with_details(conn, job_id, task_order, details_dict)
 
 
 # [DELETED] Removed incorrectly nested log_review_details function definition.
@@ -392,14 +1178,6 @@ def log_review_details(conn, task_id, details_dict):
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
     """
     # Prepare data tuple, using .get() for optional fields
-    response_format_json = None
-    if isinstance(details_dict.get('api_request_response_format'), (dict, list)):
-        response_format_json = json.dumps(details_dict['api_request_response_format'])
-
-    provider_options_json = None
-    if isinstance(details_dict.get('api_request_provider_options'), (dict, list)):
-        provider_options_json = json.dumps(details_dict['api_request_provider_options'])
-
     data = (
         task_id,
         details_dict.get('input_source'),
@@ -409,30 +1187,23 @@ def log_review_details(conn, task_id, details_dict):
         details_dict.get('api_request_temperature'),
         details_dict.get('api_request_top_p'),
         details_dict.get('api_request_stream'),
-        response_format_json,
-        provider_options_json
+        _json_column(details_dict.get('api_request_response_format')),
+        _json_column(details_dict.get('api_request_provider_options'))
     )
-    # Add final debug before entering the DB interaction block
-    print(f"DEBUG DB (Review): Prepared data tuple for task {task_id}. Types: {[type(d) for d in data]}")
     try:
-        print(f"DEBUG DB (Review): Inside try block for task {task_id}")
         with conn.cursor() as cur:
-            print(f"DEBUG DB (Review): Cursor created for task {task_id}") # ADDED
             cur.execute(sql_query, data)
-            print(f"DEBUG DB (Review): Execute successful for task {task_id}") # ADDED
             conn.commit()
-            print(f"DEBUG DB (Review): Commit successful for task {task_id}") # ADDED
-            # This is the original success message, now redundant with the one above but keep for confirmation
-            print(f"Logged Review details for task {task_id}")
+            logger.debug("Logged Review details for task %s", task_id)
     except (Exception, psycopg2.DatabaseError) as error:
         # More detailed error logging
-        print(f"ERROR logging Review details for task {task_id}:", file=sys.stderr)
-        print(f"  Error Type: {type(error).__name__}", file=sys.stderr)
-        print(f"  Error Details: {error}", file=sys.stderr)
+        logger.error("Error logging Review details for task %s:", task_id)
+        logger.error("  Error Type: %s", type(error).__name__)
+        logger.error("  Error Details: %s", error)
         # Print details about the data that failed
-        print(f"  Failing Data Tuple (types): {[type(d) for d in data]}", file=sys.stderr)
+        logger.error("  Failing Data Tuple (types): %s", [type(d).__name__ for d in data])
         # Avoid printing potentially large data directly, maybe just keys/lengths if needed
-        # print(f"  Failing Data Tuple (values): {data}", file=sys.stderr)
+        # logger.error("  Failing Data Tuple (values): %s", data)
         conn.rollback()
         # Re-raise the exception so the calling function knows it failed
         raise error
@@ -441,6 +1212,45 @@ def log_review_details(conn, task_id, details_dict):
 # Placeholder function for updating output - implementation needed
 # This would construct UPDATE statements for the respective task_details_* tables
 
+# task_type -> (UPDATE statement, builder of its parameter tuple from
+# (output_data, api_response_id, task_id)); looked up once per call
+_OUTPUT_DISPATCH = {
+    'vlm_extraction': (
+        """
+            UPDATE task_details_vlm
+            SET output_text = %s,
+                api_response_id = %s
+            WHERE task_id = %s;
+        """,
+        lambda output_data, api_response_id, task_id: (output_data.get('output_text'), api_response_id, task_id)
+    ),
+    'ner_processing': (
+        """
+            UPDATE task_details_ner
+            SET output_json = %s,
+                api_response_id = %s
+            WHERE task_id = %s;
+        """,
+        lambda output_data, api_response_id, task_id: (_json_output(output_data.get('output_json')), api_response_id, task_id)
+    ),
+    'json_comparison': (
+        """
+            UPDATE task_details_comparison
+            SET output_comparison_json = %s
+            WHERE task_id = %s;
+        """,
+        lambda output_data, api_response_id, task_id: (_json_output(output_data.get('output_comparison_json')), task_id)
+    ),
+    'vlm_review': (
+        """
+            UPDATE task_details_review
+            SET output_review_json = %s
+            WHERE task_id = %s;
+        """,
+        lambda output_data, api_response_id, task_id: (_json_output(output_data.get('output_review_json')), task_id)
+    ),
+}
+
 def update_task_details_output(conn, task_id, task_type, output_data, api_response_id=None):
     """
     Updates the output field(s) and optionally api_response_id in the relevant
@@ -449,117 +1259,32 @@ def update_task_details_output(conn, task_id, task_type, output_data, api_respon
     Args:
         conn: Database connection object.
         task_id (str): UUID of the task.
-        task_type (str): Type of the task ('vlm_extraction', 'ner_processing', 'json_comparison').
+        task_type (str): Type of the task ('vlm_extraction', 'ner_processing', 'json_comparison', 'vlm_review').
         output_data (dict): Dictionary containing output data. Keys depend on task_type:
             - vlm_extraction: {'output_text': 'extracted text'}
             - ner_processing: {'output_json': {'entities': [...]}} # The actual JSON object
             - json_comparison: {'output_comparison_json': {'Category': {...}}} # The actual JSON object
+            - vlm_review: {'output_review_json': {...}} # The actual JSON object
         api_response_id (str, optional): The ID returned by the OpenRouter API (for VLM/NER).
     """
-    sql_query = None
-    data = None
+    dispatch = _OUTPUT_DISPATCH.get(task_type)
+    if dispatch is None:
+        logger.warning("Unknown task_type '%s' for updating output details for task %s", task_type, task_id)
+        return # Do nothing if task type is unrecognized
+    sql_query, build_data = dispatch
 
     try:
-        if task_type == 'vlm_extraction':
-            sql_query = """
-                UPDATE task_details_vlm
-                SET output_text = %s,
-                    api_response_id = %s
-                WHERE task_id = %s;
-            """
-            data = (
-                output_data.get('output_text'),
-                api_response_id,
-                task_id
-            )
-        elif task_type == 'ner_processing':
-            sql_query = """
-                UPDATE task_details_ner
-                SET output_json = %s,
-                    api_response_id = %s
-                WHERE task_id = %s;
-            """
-            # Convert the output_json dictionary to a JSON string for the JSONB column
-            output_json_for_db = None
-            output_json_value = output_data.get('output_json')
-            if isinstance(output_json_value, (dict, list)):
-                 try:
-                     output_json_for_db = json.dumps(output_json_value)
-                 except TypeError as e:
-                     print(f"Error serializing NER output to JSON for task {task_id}: {e}", file=sys.stderr)
-                     # Decide how to handle - log None? Raise error?
-                     # For now, log None if serialization fails
-            elif isinstance(output_json_value, str):
-                 # If it's already a string, assume it's valid JSON (or log warning)
-                 output_json_for_db = output_json_value
-
-
-            data = (
-                output_json_for_db, # Pass the JSON string
-                api_response_id,
-                task_id
-            )
-        elif task_type == 'json_comparison':
-            sql_query = """
-                UPDATE task_details_comparison
-                SET output_comparison_json = %s
-                WHERE task_id = %s;
-            """
-             # Convert the output_comparison_json dictionary to a JSON string
-            output_comparison_json_for_db = None
-            output_comparison_value = output_data.get('output_comparison_json')
-            if isinstance(output_comparison_value, (dict, list)):
-                 try:
-                     output_comparison_json_for_db = json.dumps(output_comparison_value)
-                 except TypeError as e:
-                     print(f"Error serializing Comparison output to JSON for task {task_id}: {e}", file=sys.stderr)
-                     # Log None if serialization fails
-            elif isinstance(output_comparison_value, str):
-                 output_comparison_json_for_db = output_comparison_value
-
-            data = (
-                output_comparison_json_for_db, # Pass the JSON string
-                task_id
-            )
-        elif task_type == 'vlm_review':
-            sql_query = """
-                UPDATE task_details_review
-                SET output_review_json = %s
-                WHERE task_id = %s;
-            """
-            # Convert the output_review_json dictionary to a JSON string
-            output_review_json_for_db = None
-            output_review_value = output_data.get('output_review_json')
-            if isinstance(output_review_value, (dict, list)):
-                 try:
-                     output_review_json_for_db = json.dumps(output_review_value)
-                 except TypeError as e:
-                     print(f"Error serializing Review output to JSON for task {task_id}: {e}", file=sys.stderr)
-                     # Log None if serialization fails
-            elif isinstance(output_review_value, str):
-                 output_review_json_for_db = output_review_value
-
-            data = (
-                output_review_json_for_db, # Pass the JSON string
-                task_id
-            )
-        else:
-            print(f"Warning: Unknown task_type '{task_type}' for updating output details for task {task_id}", file=sys.stderr)
-            return # Do nothing if task type is unrecognized
-
-        # Execute the update
-        if sql_query and data:
-            print(f"DEBUG DB: Attempting update for task {task_id} ({task_type})")
-            print(f"DEBUG DB: SQL Query: {sql_query}")
-            print(f"DEBUG DB: Data Tuple Types: {[type(d) for d in data]}")
-            print(f"DEBUG DB: Data Tuple Values: {data}")
-            with conn.cursor() as cur:
-                cur.execute(sql_query, data)
-                conn.commit()
-                print(f"Updated output details for task {task_id} ({task_type})")
+        data = build_data(output_data, api_response_id, task_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Types only: the values include the full NER/comparison output
+            logger.debug("Updating output for task %s (%s): types=%s", task_id, task_type, [type(d).__name__ for d in data])
+        with conn.cursor() as cur:
+            _execute_prepared(cur, f"db_logger_output_{task_type}", sql_query, data)
+            conn.commit()
+            logger.debug("Updated output details for task %s (%s)", task_id, task_type)
 
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error updating output details for task {task_id} ({task_type}): {error}", file=sys.stderr)
+        logger.error("Error updating output details for task %s (%s): %s", task_id, task_type, error)
         conn.rollback()
 
 # --- Data Retrieval Functions ---
@@ -585,7 +1310,7 @@ def get_task_id_by_order(conn, job_id, task_order):
             if result:
                 task_id = result[0]
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving task_id for job {job_id}, order {task_order}: {error}", file=sys.stderr)
+        logger.error("Error retrieving task_id for job %s, order %s: %s", job_id, task_order, error)
         # conn.rollback() # Not needed for SELECT typically
     return task_id
 
@@ -616,10 +1341,13 @@ def get_job_status(conn, job_id):
             if result:
                 job_details = dict(result) # Convert Row object to dict
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving status for job {job_id}: {error}", file=sys.stderr)
+        logger.error("Error retrieving status for job %s: %s", job_id, error)
     return job_details
 
 
+# Rows fetched per round-trip by the server-side cursor in get_tasks_for_job
+_TASKS_FETCH_SIZE = 500
+
 def get_tasks_for_job(conn, job_id):
     """
     Retrieves summary details (id, order, type, status) for all tasks associated with a job.
@@ -633,6 +1361,7 @@ def get_tasks_for_job(conn, job_id):
               Returns empty list if no tasks found or error occurs.
     """
     tasks = []
+    owns_transaction = False
     # Cast status and type enums to text
     sql_query = """
         SELECT task_id, task_order, task_type::text, status::text, start_time, end_time, error_message
@@ -641,17 +1370,27 @@ def get_tasks_for_job(conn, job_id):
         ORDER BY task_order;
         """
     try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        if conn.autocommit:
+            # Named (server-side) cursors only live inside a transaction; make it
+            # READ ONLY (sent with its BEGIN) so it never takes a transaction ID
+            conn.autocommit = False
+            conn.readonly = True
+            owns_transaction = True
+        # Server-side cursor streams rows _TASKS_FETCH_SIZE at a time instead of
+        # buffering the whole job; RealDictCursor yields dicts with no conversion pass
+        with conn.cursor(name='tasks_cur', cursor_factory=RealDictCursor) as cur:
+            cur.itersize = _TASKS_FETCH_SIZE
             cur.execute(sql_query, (job_id,))
-            results = cur.fetchall()
-            tasks = [dict(row) for row in results] # Convert list of Row objects to list of dicts
+            tasks = list(cur)
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving tasks for job {job_id}: {error}", file=sys.stderr)
+        logger.error("Error retrieving tasks for job %s: %s", job_id, error)
+    finally:
+        if owns_transaction and not conn.closed:
+            conn.rollback() # Read-only, so just end the transaction
+            conn.readonly = None # Back to the server default
+            conn.autocommit = True
     return tasks
 
-# Need to import DictCursor
-from psycopg2.extras import DictCursor
-
 def get_vlm_input_content(conn, task_id):
     """
     Retrieves the input content and type for a VLM task.
@@ -674,7 +1413,7 @@ def get_vlm_input_content(conn, task_id):
                 content_type = result[0]
                 content = result[1]
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving VLM input content for task {task_id}: {error}", file=sys.stderr)
+        logger.error("Error retrieving VLM input content for task %s: %s", task_id, error)
     return content_type, content
 
 def get_vlm_output(conn, task_id):
@@ -697,32 +1436,45 @@ def get_vlm_output(conn, task_id):
             if result:
                 output_text = result[0]
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving VLM output for task {task_id}: {error}", file=sys.stderr)
+        logger.error("Error retrieving VLM output for task %s: %s", task_id, error)
     return output_text
 
-def get_ner_output(conn, task_id):
+def _get_json_output(conn, task_id, table, column, label):
     """
-    Retrieves the output_json for a NER processing task.
-
-    Args:
-        conn: Database connection object.
-        task_id (str): UUID of the NER task.
+    Reads one JSONB output column of a task details table.
 
     Returns:
-        dict: The NER output JSON, or None if not found or error occurs.
+        The parsed JSON, or None if not found or error occurs.
     """
+    sql_query = sql.SQL("SELECT {column} FROM {table} WHERE task_id = %s;").format(
+        column=sql.Identifier(column),
+        table=sql.Identifier(table)
+    )
     output_json = None
-    sql_query = "SELECT output_json FROM task_details_ner WHERE task_id = %s;"
     try:
         with conn.cursor() as cur:
             cur.execute(sql_query, (task_id,))
             result = cur.fetchone()
             if result and result[0]:
-                output_json = result[0] if isinstance(result[0], dict) else json.loads(result[0])
+                # The data is stored as JSONB, psycopg2 usually returns it already decoded
+                output_json = _decode_json_column(result[0])
     except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving NER output for task {task_id}: {error}", file=sys.stderr)
+        logger.error("Error retrieving %s output for task %s: %s", label, task_id, error)
     return output_json
 
+def get_ner_output(conn, task_id):
+    """
+    Retrieves the output_json for a NER processing task.
+
+    Args:
+        conn: Database connection object.
+        task_id (str): UUID of the NER task.
+
+    Returns:
+        dict: The NER output JSON, or None if not found or error occurs.
+    """
+    return _get_json_output(conn, task_id, 'task_details_ner', 'output_json', 'NER')
+
 def get_comparison_output(conn, task_id):
     """
     Retrieves the output_comparison_json for a JSON comparison task.
@@ -734,17 +1486,7 @@ def get_comparison_output(conn, task_id):
     Returns:
         dict: The comparison output JSON, or None if not found or error occurs.
     """
-    output_json = None
-    sql_query = "SELECT output_comparison_json FROM task_details_comparison WHERE task_id = %s;"
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql_query, (task_id,))
-            result = cur.fetchone()
-            if result and result[0]:
-                output_json = result[0] if isinstance(result[0], dict) else json.loads(result[0])
-    except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving comparison output for task {task_id}: {error}", file=sys.stderr)
-    return output_json
+    return _get_json_output(conn, task_id, 'task_details_comparison', 'output_comparison_json', 'comparison')
 
 
 def get_review_output(conn, task_id):
@@ -758,52 +1500,45 @@ def get_review_output(conn, task_id):
     Returns:
         dict: The review output JSON, or None if not found or error occurs.
     """
-    output_json = None
-    sql_query = "SELECT output_review_json FROM task_details_review WHERE task_id = %s;"
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql_query, (task_id,))
-            result = cur.fetchone()
-            if result and result[0]:
-                # The data is stored as JSONB, psycopg2 usually returns it as a dict
-                output_json = result[0] if isinstance(result[0], dict) else json.loads(result[0])
-    except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error retrieving Review output for task {task_id}: {error}", file=sys.stderr)
-    return output_json
+    return _get_json_output(conn, task_id, 'task_details_review', 'output_review_json', 'Review')
 
 
 
 # Example usage (for testing purposes, can be removed later)
 if __name__ == '__main__':
     print("Testing db_logger module...")
+    log_to_stderr()
+    logger.setLevel(logging.DEBUG)
     # Assumes db_config.ini exists and is configured correctly
     # Assumes the necessary tables and ENUMs exist in the database
-    connection = connect_db()
-    if connection:
+    conn = connect_db()
+    if conn:
         print("\n--- Testing Job Creation ---")
-        test_job_id = create_job(connection, 'test_workflow', './test_input.txt')
+        test_job_id = create_job(conn, 'test_workflow', './test_input.txt')
 
         if test_job_id:
-            print("\n--- Testing Task Creation ---")
-            test_task1_id = create_task(connection, test_job_id, 1, 'vlm_extraction')
-            test_task2_id = create_task(connection, test_job_id, 2, 'json_comparison')
+            print("\n--- Testing Task Creation (one transaction) ---")
+            with begin(conn) as tx:
+                test_task1_id = create_task(tx, test_job_id, 1, 'vlm_extraction')
+                test_task2_id = create_task(tx, test_job_id, 2, 'json_comparison')
 
             print("\n--- Testing Status Updates ---")
-            update_job_status(connection, test_job_id, 'in-progress')
+            update_job_status(conn, test_job_id, 'in-progress')
             if test_task1_id:
-                update_task_status(connection, test_task1_id, 'running')
+                update_task_status(conn, test_task1_id, 'running')
                 # Simulate task completion/failure
-                update_task_status(connection, test_task1_id, 'completed')
-                # update_task_status(connection, test_task1_id, 'failed', 'Simulated VLM error')
+                update_task_status(conn, test_task1_id, 'completed')
+                # update_task_status(conn, test_task1_id, 'failed', 'Simulated VLM error')
 
             if test_task2_id:
-                 update_task_status(connection, test_task2_id, 'running')
-                 update_task_status(connection, test_task2_id, 'failed', 'Simulated comparison error')
+                 # Single write for a task nobody watches while it runs
+                 complete_task(conn, test_task2_id, 'failed', datetime.datetime.now(datetime.timezone.utc),
+                               'Simulated comparison error')
 
             # Simulate job completion/failure
-            # update_job_status(connection, test_job_id, 'completed')
-            update_job_status(connection, test_job_id, 'failed', 'Job failed due to task error')
+            # update_job_status(conn, test_job_id, 'completed')
+            update_job_status(conn, test_job_id, 'failed', 'Job failed due to task error')
 
-        close_db(connection)
+        close_db(conn)
     else:
         print("Could not establish database connection for testing.")
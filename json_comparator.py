@@ -7,16 +7,36 @@ Identifies matches, additions and omissions between JSON outputs
 
 import json
 import os
-from typing import Dict, List, Union
+from itertools import chain
+from sys import intern
+from typing import Dict, List, Optional, Union
+# orjson is optional (pip install openrouter-client[fast]); it reads and writes
+# large NER/comparison files several times faster than the stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Result files are written compact by default; set COMPARE_JSON_PRETTY=on (or
+# pass --pretty / pretty=True) to indent them for reading.
+_PRETTY_DEFAULT = os.getenv("COMPARE_JSON_PRETTY", "off").lower() in ("on", "1", "true", "yes")
 
 def load_json_file(file_path: str) -> Dict:
     """Load and validate JSON file"""
-    with open(file_path, 'r') as f:
-        data = json.load(f)
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    # Both parsers raise json.JSONDecodeError (a ValueError) on bad input
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
     if not isinstance(data, dict):
         raise ValueError("Input must be a JSON object/dictionary")
     return data
 
+def _one_sided_category(items: List, label: str) -> Dict:
+    """compare_category result for a category with items on one side only"""
+    if not items:
+        return {"": "match"}
+    return {str(item): label for item in items}
+
 def compare_category(list1: List, list2: List) -> Dict:
     """Compare items between two lists with case-insensitive matching"""
     result = {}
@@ -24,17 +44,30 @@ def compare_category(list1: List, list2: List) -> Dict:
     # Handle empty lists case
     if not list1 and not list2:
         return {"": "match"}
+    # Nothing to match against: every item is an addition/omission
+    if not list2:
+        return _one_sided_category(list1, "addition")
+    if not list1:
+        return _one_sided_category(list2, "omission")
+    # Identical lists (the common case) match item for item; list == stops at
+    # the first difference, and the length check skips it outright
+    if list1 is list2 or (len(list1) == len(list2) and list1 == list2):
+        return {str(item): "match" for item in list1}
     
-    # Normalize for case-insensitive comparison
-    list1_lower = [str(item).lower() for item in list1]
-    list2_lower = [str(item).lower() for item in list2]
+    # Normalize once into sets for O(1) case-insensitive lookups
+    set1_lower = {str(item).lower() for item in list1}
+    set2_lower = {str(item).lower() for item in list2}
     
-    # Check all items
-    for item in list1 + list2:
+    # Check all items, classifying each distinct spelling once (repeats are
+    # skipped; differently-cased spellings each keep their own entry)
+    for item in chain(list1, list2):
         item_str = str(item)
-        if item_str.lower() in list1_lower and item_str.lower() in list2_lower:
+        if item_str in result:
+            continue
+        item_lower = item_str.lower()
+        if item_lower in set1_lower and item_lower in set2_lower:
             result[item_str] = "match"
-        elif item_str.lower() in list1_lower:
+        elif item_lower in set1_lower:
             result[item_str] = "addition"
         else:
             result[item_str] = "omission"
@@ -42,14 +75,28 @@ def compare_category(list1: List, list2: List) -> Dict:
 
 def compare_json_data(data1: Dict, data2: Dict) -> Dict:
     """Compare all categories in two JSON objects"""
-    all_keys = set(data1.keys()).union(set(data2.keys()))
-    return {
-        key: compare_category(
-            data1.get(key, []),
-            data2.get(key, [])
-        )
-        for key in all_keys
-    }
+    result = {key: compare_category(data1[key], data2[key]) for key in data1.keys() & data2.keys()}
+    # Categories on one side only need no matching: every item is an addition/omission
+    result.update((key, _one_sided_category(data1[key], "addition")) for key in data1.keys() - data2.keys())
+    result.update((key, _one_sided_category(data2[key], "omission")) for key in data2.keys() - data1.keys())
+    return result
+
+def write_json_file(result: Dict, file_path: str, pretty: bool = False) -> None:
+    """
+    Write a comparison result to file_path, indented only if pretty.
+
+    Serializes in one go, with orjson when installed: json.dump and indent
+    both fall back to the pure-Python encoder, while compact json.dumps stays
+    in the C one.
+    """
+    if orjson is not None:
+        data = orjson.dumps(result, option=orjson.OPT_INDENT_2 if pretty else 0)
+    elif pretty:
+        data = json.dumps(result, indent=2).encode('utf-8')
+    else:
+        data = json.dumps(result, separators=(',', ':')).encode('utf-8')
+    with open(file_path, 'wb') as f:
+        f.write(data)
 
 def generate_output_filename(file1: str, file2: str) -> str:
     """Generate default comparison filename"""
@@ -57,11 +104,55 @@ def generate_output_filename(file1: str, file2: str) -> str:
     base2 = os.path.splitext(os.path.basename(file2))[0]
     return f"{base1}_{base2}_comparison.json"
 
+def save_comparison(
+    result: Dict,
+    file1: str,
+    file2: str,
+    output_path: str = None,
+    output_file: str = None,
+    pretty: bool = False
+) -> Optional[str]:
+    """
+    Write a comparison result to output_file, or to an auto-named file in output_path
+    
+    Args:
+        result: Comparison result to write
+        file1: Path to first JSON file (for the auto-generated filename)
+        file2: Path to second JSON file
+        output_path: Optional directory for output (auto-generated filename)
+        output_file: Optional full output path; takes precedence over output_path
+        pretty: Indent the output file
+        
+    Returns:
+        The path written, or None if neither output option was given
+    """
+    # Determine the final path and ensure directory exists
+    if output_file: # --output argument (full path) provided
+        final_write_path = output_file
+        output_dir_to_create = os.path.dirname(final_write_path)
+    elif output_path: # --output-dir argument provided
+        final_write_path = os.path.join(output_path, generate_output_filename(file1, file2))
+        output_dir_to_create = output_path
+    else: # Neither --output nor --output-dir given: don't write to file
+        return None
+
+    # Ensure the target directory exists
+    if output_dir_to_create:
+        try:
+            os.makedirs(output_dir_to_create, exist_ok=True)
+        except OSError as e:
+            raise ValueError(f"Could not create output directory '{output_dir_to_create}'. {e}")
+
+    # Write the comparison result
+    write_json_file(result, final_write_path, pretty)
+    return final_write_path
+
 def compare_json_files(
     file1: str,
     file2: str,
     output_path: str = None,
-    output_file: str = None
+    output_file: str = None,
+    pretty: Optional[bool] = None
 ) -> Dict:
     """
     Main function to compare two JSON files
@@ -71,6 +162,7 @@ def compare_json_files(
         file2: Path to second JSON file  
         output_path: Optional directory for output
         output_file: Optional full output path
+        pretty: Indent the output file (default: COMPARE_JSON_PRETTY, off)
         
     Returns:
         Dict with comparison results
@@ -81,33 +173,30 @@ def compare_json_files(
         
         result = compare_json_data(data1, data2)
         
-        # Determine the final path and ensure directory exists
-        final_write_path = None
-        if output_file: # --output argument (full path) provided
-            final_write_path = output_file
-            output_dir_to_create = os.path.dirname(final_write_path)
-        elif output_path: # --output-dir argument provided
-            default_filename = generate_output_filename(file1, file2)
-            final_write_path = os.path.join(output_path, default_filename)
-            output_dir_to_create = output_path
-        # If neither --output nor --output-dir is given, final_write_path remains None, and we don't write to file
-
-        # Write file if a path was determined
-        if final_write_path:
-            # Ensure the target directory exists
-            if output_dir_to_create and not os.path.exists(output_dir_to_create):
-                 try:
-                     os.makedirs(output_dir_to_create, exist_ok=True)
-                 except OSError as e:
-                     raise ValueError(f"Could not create output directory '{output_dir_to_create}'. {e}")
-
-            # Write the comparison result
-            with open(final_write_path, 'w') as f:
-                json.dump(result, f, indent=2)
+        save_comparison(result, file1, file2, output_path, output_file,
+                        _PRETTY_DEFAULT if pretty is None else pretty)
         return result
         
     except Exception as e:
         raise ValueError(f"Comparison failed: {str(e)}")
+
+def _index_entities(entities: List) -> Dict:
+    """Map (entity_name, entity_value) to each entity that has both, in one pass"""
+    index = {}
+    for e in entities:
+        get = e.get
+        name = get('entity_name')
+        value = get('entity_value')
+        if name and value:
+            # The same few entity names repeat across thousands of entities;
+            # interning lets every key share one string object per name
+            index[(intern(str(name)), str(value))] = e
+    return index
+
+def _one_sided_entity(entity: Dict, label: str) -> Dict:
+    """Tag an entity found on only one side, keeping its original fields and confidence"""
+    return {**entity, 'comparison': label, 'confidence': entity.get('confidence', 'N/A')}
+
 def run_json_comparison(data1: Dict, data2: Dict):
     """
     Compares two NER result dictionaries and returns the comparison result dictionary.
@@ -133,22 +222,27 @@ def run_json_comparison(data1: Dict, data2: Dict):
         if not isinstance(entities1, list) or not isinstance(entities2, list):
              raise ValueError("Input JSON must contain an 'entities' list.")
 
-        # Create dictionaries keyed by name+value
-        dict1 = {f"{e.get('entity_name', '')}_{e.get('entity_value', '')}": e for e in entities1 if e.get('entity_name') and e.get('entity_value')}
-        dict2 = {f"{e.get('entity_name', '')}_{e.get('entity_value', '')}": e for e in entities2 if e.get('entity_name') and e.get('entity_value')}
+        # Create dictionaries keyed by (name, value); the parts are kept apart so
+        # values containing '_' can't collide, and stringified so keys always sort
+        dict1 = _index_entities(entities1)
+        dict2 = _index_entities(entities2)
 
-        all_keys = sorted(list(set(dict1.keys()).union(set(dict2.keys()))))
+        all_keys = sorted(dict1.keys() | dict2.keys())
 
         comparison_results = []
+        append = comparison_results.append
+        get1 = dict1.get
+        get2 = dict2.get
         for key in all_keys:
-            entity1 = dict1.get(key)
-            entity2 = dict2.get(key)
-            result_entity = {}
+            entity1 = get1(key)
+            entity2 = get2(key)
 
             if entity1 and entity2: # Match
-                result_entity['entity_name'] = entity1['entity_name']
-                result_entity['entity_value'] = entity1['entity_value']
-                result_entity['comparison'] = "match"
+                result_entity = {
+                    'entity_name': entity1['entity_name'],
+                    'entity_value': entity1['entity_value'],
+                    'comparison': "match",
+                }
                 # Confidence calculation
                 try:
                     c1 = float(entity1.get('confidence', 0)) / 100.0
@@ -160,18 +254,11 @@ def run_json_comparison(data1: Dict, data2: Dict):
                      # Handle cases where confidence is missing or not a number
                      result_entity['confidence'] = "N/A" # Or some other indicator
             elif entity1: # Addition (in NER1 only)
-                result_entity = entity1.copy() # Copy original entity
-                result_entity['comparison'] = "addition"
-                # Keep original confidence (ensure it's handled as number/string consistently)
-                result_entity['confidence'] = entity1.get('confidence', 'N/A')
-            elif entity2: # Omission (in NER2 only)
-                result_entity = entity2.copy() # Copy original entity
-                result_entity['comparison'] = "omission"
-                 # Keep original confidence
-                result_entity['confidence'] = entity2.get('confidence', 'N/A')
-
-            if result_entity: # Ensure we have something to add
-                comparison_results.append(result_entity)
+                result_entity = _one_sided_entity(entity1, "addition")
+            else: # Omission (in NER2 only)
+                result_entity = _one_sided_entity(entity2, "omission")
+
+            append(result_entity)
 
         # Return in the same structure as input if needed, or just the list
         return {"entities": comparison_results}
@@ -182,10 +269,8 @@ def run_json_comparison(data1: Dict, data2: Dict):
         raise ValueError(f"Comparison failed: {str(e)}")
 
 
-# Remove duplicate main definition
-# def main():
-#     """CLI entry point for JSON comparison - Loads files and calls compare_json_files"""
-    """CLI entry point for JSON comparison"""
+def main():
+    """CLI entry point for JSON comparison - Loads files and calls run_json_comparison"""
     import argparse
     import sys
     parser = argparse.ArgumentParser(
@@ -195,43 +280,23 @@ def run_json_comparison(data1: Dict, data2: Dict):
     parser.add_argument('file2', help='Second JSON file path')
     parser.add_argument('--output', help='Output file path')
     parser.add_argument('--output-dir', help='Output directory')
+    parser.add_argument('--pretty', action='store_true', default=_PRETTY_DEFAULT,
+                        help='Indent the output file (default: compact, or COMPARE_JSON_PRETTY)')
     
     args = parser.parse_args()
     
     try:
-        # Call the core comparison logic first
-        result = run_json_comparison(args.file1, args.file2)
+        # Load the files, then call the same comparison logic used in-process by compare_llms
+        result = run_json_comparison(load_json_file(args.file1), load_json_file(args.file2))
 
         # Handle file output based on CLI arguments
-        output_file_cli = args.output
-        output_dir_cli = args.output_dir
-        final_write_path = None
-
-        if output_file_cli: # --output argument (full path) provided
-            final_write_path = output_file_cli
-            output_dir_to_create = os.path.dirname(final_write_path)
-        elif output_dir_cli: # --output-dir argument provided
-            default_filename = generate_output_filename(args.file1, args.file2)
-            final_write_path = os.path.join(output_dir_cli, default_filename)
-            output_dir_to_create = output_dir_cli
-
-        # Write file if a path was determined
+        final_write_path = save_comparison(result, args.file1, args.file2, args.output_dir, args.output, args.pretty)
         if final_write_path:
-            # Ensure the target directory exists
-            if output_dir_to_create and not os.path.exists(output_dir_to_create):
-                 try:
-                     os.makedirs(output_dir_to_create, exist_ok=True)
-                 except OSError as e:
-                     raise ValueError(f"Could not create output directory '{output_dir_to_create}'. {e}") # Re-raise
-
-            # Write the comparison result
-            with open(final_write_path, 'w') as f:
-                json.dump(result, f, indent=2)
             print(f"Comparison results saved to: {final_write_path}")
 
         print("Comparison successful. Results:")
         print(json.dumps(result, indent=2))
-    except ValueError as e:
+    except (ValueError, OSError) as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
@@ -8,25 +8,26 @@ Usage:
     python openrouter_client.py --input <input_file> --config <config_file> [--output <output_file>]
 """
 
-import argparse
 import os
 import sys
 # Handle both package import and direct script execution
 try:
     from openrouter.config_handler import load_config
-    from openrouter.api_client import process_text, process_image, process_pdf
+    from openrouter.api_client import process_text, process_text_content, process_image, process_pdf
     from openrouter.utils import determine_input_type, generate_default_output_filename, format_response
 except ImportError:
     from config_handler import load_config
-    from api_client import process_text, process_image, process_pdf
+    from api_client import process_text, process_text_content, process_image, process_pdf
     from utils import determine_input_type, generate_default_output_filename, format_response
-def run_openrouter_processing(input_path, config_path):
+def run_openrouter_processing(input_path, config_path, *, config=None):
     """
     Processes an input file using OpenRouter based on a configuration file.
 
     Args:
         input_path (str): Path or URL to the input file (image, PDF, text).
         config_path (str): Path to the configuration file.
+        config (dict, optional): The already loaded configuration from config_path,
+            for callers that need it themselves as well.
 
     Returns:
         dict: The raw JSON response dictionary from the OpenRouter API,
@@ -40,7 +41,8 @@ def run_openrouter_processing(input_path, config_path):
 
     try:
         # Load configuration
-        config = load_config(config_path)
+        if config is None:
+            config = load_config(config_path)
 
         # Determine input type
         input_type = determine_input_type(input_path)
@@ -62,9 +64,51 @@ def run_openrouter_processing(input_path, config_path):
         return {"error": f"Processing failed: {str(e)}"}
 
 
+def run_openrouter_text_processing(text_content, config_path):
+    """
+    Processes in-memory text using OpenRouter based on a configuration file,
+    without requiring the text to be written to an input file first.
+
+    Args:
+        text_content (str): The text to send (treated like a text input file).
+        config_path (str): Path to the configuration file.
+
+    Returns:
+        dict: The raw JSON response dictionary from the OpenRouter API,
+              or a dictionary containing an 'error' key if processing fails.
+    """
+    if not os.path.exists(config_path):
+        return {"error": f"Configuration file '{config_path}' does not exist"}
+
+    try:
+        config = load_config(config_path)
+        print(f"Processing text: <{len(text_content)} chars in memory> with config {config_path}")
+        return process_text_content(text_content, config)
+    except Exception as e:
+        print(f"Error during OpenRouter processing: {e}", file=sys.stderr)
+        return {"error": f"Processing failed: {str(e)}"}
+
+
+def get_response_content(response):
+    """
+    Extracts the message content written to output files for a response.
+
+    Args:
+        response (dict): The raw JSON response dictionary from the OpenRouter API.
+
+    Returns:
+        str: The first choice's message content, or the formatted response
+             if it has no choices. None if the message content is null.
+    """
+    if "choices" in response:
+        return response["choices"][0]["message"].get("content", "")
+    return format_response(response)
+
+
 def main():
     """CLI Entry point."""
-def main():
+    import argparse
+
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Process files through the OpenRouter API")
     parser.add_argument("--input", required=True, help="Path to input file (image, PDF, or text)")
@@ -73,6 +117,7 @@ def main():
     output_group.add_argument("--output", help="Complete output file path including filename")
     output_group.add_argument("--output-path", help="Directory path for output (uses auto-generated filename)")
     parser.add_argument("--debug", help="Include prompts in output file (Y/N)", default="N")
+    parser.add_argument("--verbose", action="store_true", help="Print the full formatted response even when stdout is not a terminal")
     args = parser.parse_args()
     
     # Validate input file exists for local files
@@ -85,8 +130,15 @@ def main():
         print(f"Error: Configuration file '{args.config}' does not exist")
         sys.exit(1)
     
+    # Load the config once; it is used again below for output formatting
+    try:
+        config = load_config(args.config)
+    except Exception as e:
+        print(f"Error: Could not load configuration '{args.config}': {e}", file=sys.stderr)
+        sys.exit(1)
+
     # Call the core processing function
-    response = run_openrouter_processing(args.input, args.config)
+    response = run_openrouter_processing(args.input, args.config, config=config)
 
     # Check for errors returned by the processing function
     if response and "error" in response:
@@ -97,9 +149,6 @@ def main():
         sys.exit(1)
 
     # --- Handle CLI Output ---
-    # Load config again just for output formatting (could optimize by returning config from run_ function)
-    config = load_config(args.config)
-
     # Determine output file path for CLI usage
     output_file = None
     if args.output:
@@ -108,9 +157,9 @@ def main():
         output_file = os.path.join(args.output_path, generate_default_output_filename(args.input, config.get("MODEL", "unknown_model")))
         # Ensure output directory exists
         output_dir = os.path.dirname(output_file)
-        if output_dir and not os.path.exists(output_dir):
+        if output_dir:
              try:
-                 os.makedirs(output_dir)
+                 os.makedirs(output_dir, exist_ok=True)
              except OSError as e:
                  print(f"Error: Could not create output directory '{output_dir}'. {e}", file=sys.stderr)
                  sys.exit(1) # Exit if cannot create dir for output
@@ -118,11 +167,12 @@ def main():
         # Default behavior if neither --output nor --output-path is given
          output_file = generate_default_output_filename(args.input, config.get("MODEL", "unknown_model"))
     
-    # Format the response for display
-    formatted_output = format_response(response)
-    
-    # Print full formatted output to screen
-    print(formatted_output)
+    # Print the full formatted response only when someone is watching; when
+    # stdout is piped or redirected a one-line summary avoids formatting it at all
+    if args.verbose or sys.stdout.isatty():
+        print(format_response(response))
+    else:
+        print(f"[{len(response.get('choices') or [])} choice(s) received]")
     
     # Prepare output based on debug mode
     try:
@@ -150,9 +200,9 @@ def main():
             except (KeyError, IndexError, TypeError):
                  output_content += "[Could not extract content from response structure]"
         else:
-            output_content = response["choices"][0]["message"].get("content", "") if "choices" in response else formatted_output
+            output_content = get_response_content(response)
     except Exception as e:
-        output_content = f"Error: {str(e)}\n\n{formatted_output}"
+        output_content = f"Error: {str(e)}\n\n{format_response(response)}"
     
     # Save output to file
     with open(output_file, "w", encoding="utf-8") as f:
@@ -27,6 +27,13 @@ setup(
         "python-dotenv>=0.19", # Added for loading .env files
     ],
     extras_require={
+        "async": [
+            "aiohttp>=3.8",   # For acall_openrouter_api / aprocess_*
+        ],
+        "fast": [
+            "orjson>=3.6",    # Faster JSON (de)serialization of API payloads
+            "pypdfium2>=4.0", # C-backed PDF text extraction (PyPDF2 stays the fallback)
+        ],
         "dev": [
             "pytest>=6.0",
             "black>=21.0",
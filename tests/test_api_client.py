@@ -0,0 +1,126 @@
+"""Unit tests for the OpenRouter API client (no requests are sent)"""
+
+import asyncio
+import importlib.util
+import unittest
+from unittest import mock
+import os
+import tempfile
+import sys
+import os.path
+
+# Adjust path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+HAVE_REQUESTS = importlib.util.find_spec("requests") is not None
+HAVE_AIOHTTP = importlib.util.find_spec("aiohttp") is not None
+if HAVE_REQUESTS:
+    import api_client
+    from urllib3.exceptions import MaxRetryError, ReadTimeoutError
+    from urllib3.response import HTTPResponse
+
+
+@unittest.skipUnless(HAVE_REQUESTS, "requests is not installed")
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.retry = api_client._ADAPTER.max_retries
+
+    def test_retry_after_is_capped(self):
+        response = HTTPResponse(body=b"", headers={"Retry-After": "3600"}, status=429)
+        self.assertEqual(self.retry.get_retry_after(response), api_client._RETRY_BACKOFF_MAX)
+        response = HTTPResponse(body=b"", headers={"Retry-After": "2"}, status=429)
+        self.assertEqual(self.retry.get_retry_after(response), 2)
+
+    def test_retryable_status_is_retried(self):
+        response = HTTPResponse(body=b"", status=503)
+        retry = self.retry.increment(method="POST", url="/chat/completions", response=response)
+        self.assertEqual(retry.total, api_client._RETRY_TOTAL - 1)
+
+    def test_read_timeout_is_not_retried(self):
+        # The request was sent, so the completion may already be running
+        error = ReadTimeoutError(None, "/chat/completions", "read timed out")
+        with self.assertRaises(MaxRetryError):
+            self.retry.increment(method="POST", url="/chat/completions", error=error)
+
+
+MESSAGES = [{"role": "user", "content": "Extract the entities."}]
+DETERMINISTIC = {"temperature": 0, "response_format": {"type": "json_object"}}
+
+
+@unittest.skipUnless(HAVE_REQUESTS, "requests is not installed")
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.post = self.patch(mock.patch.object(api_client._SESSION, "post"))
+        self.patch(mock.patch.object(api_client, "_CACHE_DIR", tmpdir.name))
+        self.patch(mock.patch.dict(os.environ, {"OPENROUTER_CACHE": "on"}))
+        self.post.return_value.content = b'{"id": "gen-1", "choices": []}'
+
+    def patch(self, patcher):
+        patched = patcher.start()
+        self.addCleanup(patcher.stop)
+        return patched
+
+    def call(self, base_url="https://openrouter.ai/api/v1", config_options=DETERMINISTIC):
+        return api_client.call_openrouter_api("key", base_url, "vendor/model", MESSAGES, dict(config_options))
+
+    def test_key_covers_endpoint_and_provider_routing(self):
+        key = api_client._cache_key("https://openrouter.ai/api/v1", "vendor/model", MESSAGES, DETERMINISTIC)
+        self.assertEqual(key, api_client._cache_key("https://openrouter.ai/api/v1/", "vendor/model", MESSAGES, DETERMINISTIC))
+        self.assertNotEqual(key, api_client._cache_key("http://localhost:8000/v1", "vendor/model", MESSAGES, DETERMINISTIC))
+        self.assertNotEqual(key, api_client._cache_key("https://openrouter.ai/api/v1", "vendor/model", MESSAGES,
+                                                       {**DETERMINISTIC, "provider": {"order": ["a"]}}))
+        self.assertNotEqual(key, api_client._cache_key("https://openrouter.ai/api/v1", "vendor/other", MESSAGES, DETERMINISTIC))
+
+    def test_repeated_deterministic_request_is_served_from_cache(self):
+        self.assertEqual(self.call(), {"id": "gen-1", "choices": []})
+        self.assertEqual(self.call(), {"id": "gen-1", "choices": []})
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_other_endpoint_is_a_miss(self):
+        self.call()
+        self.call(base_url="http://localhost:8000/v1")
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_sampled_request_is_not_cached(self):
+        self.call(config_options={"temperature": 0.7})
+        self.call(config_options={"temperature": 0.7})
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_error_is_not_cached(self):
+        self.post.return_value.content = b'not json'
+        self.assertIn("error", self.call())
+        self.post.return_value.content = b'{"id": "gen-2"}'
+        self.assertEqual(self.call(), {"id": "gen-2"})
+        self.assertEqual(self.post.call_count, 2)
+
+
+
+@unittest.skipUnless(HAVE_REQUESTS and HAVE_AIOHTTP, "requests or aiohttp is not installed")
+class TestAsyncSession(unittest.TestCase):
+    async def get_session(self):
+        session = await api_client._get_async_session()
+        self.assertIs(await api_client._get_async_session(), session) # Shared within the loop
+        return session
+
+    def test_session_is_closed_when_its_loop_shuts_down(self):
+        first = asyncio.run(self.get_session())
+        second = asyncio.run(self.get_session())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(api_client._ASYNC_SESSIONS, {})
+
+    def test_aclose_session(self):
+        async def open_and_close():
+            session = await self.get_session()
+            await api_client.aclose_session()
+            self.assertTrue(session.closed)
+            self.assertIsNot(await api_client._get_async_session(), session)
+        asyncio.run(open_and_close())
+        self.assertEqual(api_client._ASYNC_SESSIONS, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Unit tests for configuration loading"""
+
+import unittest
+import os
+import tempfile
+import sys
+import os.path
+
+# Adjust path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config_handler import load_config
+
+CONFIG_TEMPLATE = "API_KEY=key\nBASE_URL=https://openrouter.ai/api/v1\nMODEL={model}\n"
+
+class TestLoadConfig(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.config_file = os.path.join(tmpdir.name, "config.ini")
+
+    def write_config(self, model, mtime):
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            f.write(CONFIG_TEMPLATE.format(model=model))
+        os.utime(self.config_file, (mtime, mtime))
+
+    def test_edited_file_is_reloaded(self):
+        self.write_config("model/one", 1_000_000)
+        self.assertEqual(load_config(self.config_file)["MODEL"], "model/one")
+
+        self.write_config("model/two", 2_000_000)
+        self.assertEqual(load_config(self.config_file)["MODEL"], "model/two")
+
+    def test_unchanged_file_is_served_from_memory(self):
+        self.write_config("model/one", 1_000_000)
+        self.assertEqual(load_config(self.config_file)["MODEL"], "model/one")
+
+        # Same modification time: the parsed result is reused without reading the file
+        self.write_config("model/two", 1_000_000)
+        self.assertEqual(load_config(self.config_file)["MODEL"], "model/one")
+
+    def test_each_call_gets_its_own_copy(self):
+        self.write_config("model/one", 1_000_000)
+        config = load_config(self.config_file)
+        config["MODEL"] = "changed"
+        self.assertEqual(load_config(self.config_file)["MODEL"], "model/one")
+        self.assertEqual(config["TEMPERATURE"], "0.7") # Defaults are filled in
+
+if __name__ == '__main__':
+    unittest.main()
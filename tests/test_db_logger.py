@@ -0,0 +1,395 @@
+"""
+Unit tests for the database logger module.
+
+Most tests use fake connections. The tests that need a PostgreSQL server run when
+DB_LOGGER_TEST_DSN is set (e.g. "dbname=test user=postgres"); they create TEMP
+tables on their own session, so nothing is left behind in the database.
+"""
+
+import importlib.util
+import unittest
+from unittest import mock
+import sys
+import time
+import types
+import uuid
+import os.path
+
+# Adjust path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+HAVE_PSYCOPG2 = importlib.util.find_spec("psycopg2") is not None
+if HAVE_PSYCOPG2:
+    import psycopg2
+    import db_logger
+
+TEST_DSN = os.environ.get("DB_LOGGER_TEST_DSN")
+
+# TEMP tables shadow any real ones of the same name for the test session
+TEST_SCHEMA_SQL = """
+CREATE TEMP TABLE jobs (
+    job_id UUID PRIMARY KEY,
+    workflow_name TEXT,
+    input_source TEXT,
+    status TEXT,
+    start_time TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    end_time TIMESTAMP WITH TIME ZONE,
+    error_message TEXT
+);
+CREATE TEMP TABLE task_details_ner (
+    task_id UUID PRIMARY KEY,
+    input_text TEXT,
+    api_request_model TEXT,
+    api_request_system_prompt TEXT,
+    api_request_user_prompt TEXT,
+    api_request_temperature REAL,
+    api_request_top_p REAL,
+    api_request_stream BOOLEAN,
+    api_request_response_format JSONB,
+    api_request_provider_options JSONB
+);
+CREATE TEMP TABLE task_details_comparison (
+    task_id UUID PRIMARY KEY,
+    input_json_path1 TEXT,
+    input_json_path2 TEXT
+);
+"""
+
+
+class Unadaptable:
+    """Parameter value that fails before anything is sent, like one psycopg2 cannot adapt"""
+
+
+class FakeCursor:
+    """Records the statements sent to it"""
+
+    def __init__(self, conn):
+        self.connection = conn
+
+    def execute(self, query, vars=None):
+        if any(isinstance(value, Unadaptable) for value in vars or ()):
+            raise TypeError("can't adapt type 'Unadaptable'")
+        if self.connection.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self.connection.executed.append((query, vars))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection; nothing is sent anywhere"""
+
+    def __init__(self, broken=False, fail_commit=False):
+        self.broken = broken
+        self.fail_commit = fail_commit
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.autocommit = False
+        self.closed = 0
+        self.info = types.SimpleNamespace(transaction_status=0) # TRANSACTION_STATUS_IDLE
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        if self.fail_commit:
+            raise RuntimeError("could not commit")
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestStatusTimes(unittest.TestCase):
+    def test_job_end_time_set_on_final_status(self):
+        conn = FakeConnection()
+        db_logger.update_job_status(conn, "job-1", "completed")
+        db_logger.update_job_status(conn, "job-1", "in-progress")
+        (done_sql, done_vars), (running_sql, running_vars) = conn.executed
+        self.assertIn("end_time = CASE WHEN %s THEN NOW()", done_sql)
+        self.assertEqual(done_vars, ("completed", True, None, "job-1"))
+        self.assertEqual(running_vars, ("in-progress", False, None, "job-1"))
+
+    def test_task_start_and_end_times(self):
+        conn = FakeConnection()
+        db_logger.update_task_status(conn, "task-1", "running")
+        db_logger.update_task_status(conn, "task-1", "failed", "boom")
+        (running_sql, running_vars), (_, failed_vars) = conn.executed
+        self.assertIn("start_time = CASE WHEN %s AND start_time IS NULL THEN NOW()", running_sql)
+        self.assertIn("end_time = CASE WHEN %s THEN NOW()", running_sql)
+        self.assertEqual(running_vars, ("running", True, False, None, "task-1"))
+        self.assertEqual(failed_vars, ("failed", False, True, "boom", "task-1"))
+
+    def test_complete_task_sets_end_time(self):
+        conn = FakeConnection()
+        db_logger.complete_task(conn, "task-1", "completed", "2024-01-01T00:00:00+00:00")
+        sql_query, sql_vars = conn.executed[0]
+        self.assertIn("start_time = %s", sql_query)
+        self.assertIn("end_time = NOW()", sql_query)
+        self.assertEqual(sql_vars, ("completed", "2024-01-01T00:00:00+00:00", None, "task-1"))
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestBegin(unittest.TestCase):
+    def test_failed_commit_is_raised_after_rollback(self):
+        conn = FakeConnection(fail_commit=True)
+        conn.autocommit = True
+        with self.assertRaises(RuntimeError):
+            with db_logger.begin(conn) as tx:
+                db_logger.update_job_status(tx, "job-1", "completed")
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertTrue(conn.autocommit)
+
+    def test_block_is_committed_once(self):
+        conn = FakeConnection()
+        with db_logger.begin(conn) as tx:
+            db_logger.update_job_status(tx, "job-1", "in-progress")
+            db_logger.update_job_status(tx, "job-1", "completed")
+        self.assertEqual(conn.commits, 1)
+        self.assertEqual(len(conn.executed), 2)
+        for sql_query, _ in conn.executed:
+            self.assertTrue(sql_query.startswith("SAVEPOINT db_logger_step; "))
+            self.assertIn("UPDATE jobs", sql_query)
+
+    def test_call_failing_before_send_keeps_the_savepoint(self):
+        conn = FakeConnection()
+        with db_logger.begin(conn) as tx:
+            db_logger.update_job_status(tx, "job-1", "failed", Unadaptable()) # Nothing reaches the server
+            db_logger.update_job_status(tx, "job-1", "completed")
+        (sql_query, sql_vars), = conn.executed # No ROLLBACK TO SAVEPOINT for the failed call
+        self.assertTrue(sql_query.startswith("SAVEPOINT db_logger_step; "))
+        self.assertEqual(sql_vars, ("completed", True, None, "job-1"))
+        self.assertEqual(conn.commits, 1)
+
+    def test_call_failing_before_send_does_not_undo_the_previous_call(self):
+        conn = FakeConnection()
+        with db_logger.begin(conn) as tx:
+            db_logger.update_job_status(tx, "job-1", "in-progress")
+            db_logger.update_job_status(tx, "job-1", "failed", Unadaptable())
+        self.assertEqual(len(conn.executed), 1)
+        self.assertEqual(conn.commits, 1)
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestExecutePrepared(unittest.TestCase):
+    SQL = "UPDATE tasks SET status = %s, error_message = %s WHERE task_id = %s;"
+
+    def test_unpooled_connection_executes_directly(self):
+        conn = FakeConnection()
+        db_logger._execute_prepared(conn.cursor(), "update_task", self.SQL, ("failed", "boom", "task-1"))
+        self.assertEqual(conn.executed, [(self.SQL, ("failed", "boom", "task-1"))])
+
+    def test_placeholders_are_numbered_and_prepared_once(self):
+        conn = FakeConnection()
+        conn.prepared_statements = set()
+        db_logger._execute_prepared(conn.cursor(), "update_task", self.SQL, ("failed", "boom", "task-1"))
+        db_logger._execute_prepared(conn.cursor(), "update_task", self.SQL, ("completed", None, "task-2"))
+        self.assertEqual(conn.executed, [
+            ("PREPARE update_task AS UPDATE tasks SET status = $1, error_message = $2 WHERE task_id = $3;", None),
+            ("EXECUTE update_task (%s, %s, %s);", ("failed", "boom", "task-1")),
+            ("EXECUTE update_task (%s, %s, %s);", ("completed", None, "task-2")),
+        ])
+        self.assertEqual(conn.prepared_statements, {"update_task"})
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestTransactionConnection(unittest.TestCase):
+    def test_savepoint_is_sent_with_the_next_statement_only(self):
+        conn = FakeConnection()
+        tx = db_logger._TransactionConnection(conn)
+        tx.commit()
+        with tx.cursor() as cur:
+            cur.execute("SELECT 1;")
+            cur.execute("SELECT 2;")
+        self.assertEqual(conn.executed, [("SAVEPOINT db_logger_step; SELECT 1;", None), ("SELECT 2;", None)])
+
+    def test_rollback_without_statements_is_a_no_op(self):
+        conn = FakeConnection()
+        tx = db_logger._TransactionConnection(conn)
+        tx.commit()
+        tx.rollback()
+        self.assertEqual(conn.executed, [])
+        self.assertEqual(conn.rollbacks, 0)
+
+    def test_rollback_returns_to_the_last_savepoint(self):
+        conn = FakeConnection()
+        tx = db_logger._TransactionConnection(conn)
+        tx.commit()
+        with tx.cursor() as cur:
+            cur.execute("SELECT 1;")
+        tx.rollback()
+        self.assertEqual(conn.executed[-1], ("ROLLBACK TO SAVEPOINT db_logger_step;", None))
+        self.assertEqual(conn.rollbacks, 0) # The transaction itself stays open
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestCopyFormat(unittest.TestCase):
+    def test_values_are_escaped_for_copy_text_format(self):
+        self.assertEqual(db_logger._copy_text(None), "\\N")
+        self.assertEqual(db_logger._copy_text(True), "t")
+        self.assertEqual(db_logger._copy_text(0.5), "0.5")
+        self.assertEqual(db_logger._copy_text("a\tb\nc\\d\re"), "a\\tb\\nc\\\\d\\re")
+        # JSON's own escapes are escaped again for COPY
+        json_field = db_logger._copy_text(db_logger._json_column({"k": "v\n"}))
+        self.assertIn('"v\\\\n"', json_field)
+        self.assertNotIn("\n", json_field)
+
+    def test_stream_serves_rows_in_reads_of_any_size(self):
+        rows = [(1, "a"), (2, None), (3, "c\td")]
+        expected = "1\ta\n2\t\\N\n3\tc\\td\n"
+        self.assertEqual(db_logger._CopyRowStream(rows).read(), expected)
+        stream = db_logger._CopyRowStream(rows)
+        chunks = iter(lambda: stream.read(4), '')
+        self.assertEqual(''.join(chunks), expected)
+
+
+class FakePool:
+    """Hands out the given connections in order and records what comes back"""
+
+    def __init__(self, conns):
+        self.conns = list(conns)
+        self.returned = []
+
+    def getconn(self, key=None):
+        return self.conns.pop(0)
+
+    def putconn(self, conn=None, key=None, close=False):
+        self.returned.append((conn, close))
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestPoolCheckout(unittest.TestCase):
+    def test_dead_idle_connection_is_discarded(self):
+        dead, alive = FakeConnection(broken=True), FakeConnection()
+        db_pool = FakePool([dead, alive])
+        dead.idle_since = time.monotonic() - db_logger._POOL_PING_AFTER - 1 # Idle long enough to be pinged
+        self.assertIs(db_logger._checkout(db_pool), alive)
+        self.assertEqual(db_pool.returned, [(dead, True)])
+
+    def test_recently_used_connection_is_not_pinged(self):
+        conn = FakeConnection()
+        conn.idle_since = time.monotonic()
+        self.assertIs(db_logger._checkout(FakePool([conn])), conn)
+        self.assertEqual(conn.executed, [])
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2, "psycopg2 is not installed")
+class TestPoolRetention(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("psycopg2.connect", side_effect=lambda *args, **kwargs: FakeConnection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_returned_connections_stay_open_up_to_maxconn(self):
+        db_pool = db_logger._BlockingConnectionPool(1, 4)
+        conns = [db_pool.getconn() for _ in range(3)]
+        for conn in conns:
+            db_pool.putconn(conn)
+        self.assertFalse(any(conn.closed for conn in conns))
+        self.assertTrue(all(conn.idle_since is not None for conn in conns))
+        self.assertIn(db_pool.getconn(), conns) # Reused, not reopened
+
+    def test_discarded_connection_gets_no_idle_time(self):
+        db_pool = db_logger._BlockingConnectionPool(1, 4)
+        conn = db_pool.getconn()
+        conn.idle_since = None
+        db_pool.putconn(conn, close=True)
+        self.assertTrue(conn.closed)
+        self.assertIsNone(conn.idle_since)
+
+
+
+@unittest.skipUnless(HAVE_PSYCOPG2 and TEST_DSN, "DB_LOGGER_TEST_DSN is not set")
+class DatabaseTestCase(unittest.TestCase):
+    """Base class for tests that run against a PostgreSQL server"""
+
+    def setUp(self):
+        self.conn = psycopg2.connect(TEST_DSN)
+        self.addCleanup(self.conn.close)
+        with self.conn.cursor() as cur:
+            cur.execute(TEST_SCHEMA_SQL)
+        self.conn.commit()
+
+    def fetch(self, query):
+        with self.conn.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchall()
+
+
+class TestInsertRows(DatabaseTestCase):
+    def test_multi_row_insert(self):
+        task_ids = [str(uuid.uuid4()) for _ in range(3)]
+        details = [(task_id, {'input_json_path1': f"ner1_{i}.json", 'input_json_path2': f"ner2_{i}.json"})
+                   for i, task_id in enumerate(task_ids)]
+        with mock.patch.object(db_logger, "execute_values", wraps=db_logger.execute_values) as execute_values:
+            db_logger.log_comparison_details_bulk(self.conn, details)
+        execute_values.assert_called_once()
+        rows = self.fetch("SELECT task_id::text, input_json_path1, input_json_path2 FROM task_details_comparison ORDER BY input_json_path1;")
+        self.assertEqual(rows, [(task_id, f"ner1_{i}.json", f"ner2_{i}.json") for i, task_id in enumerate(task_ids)])
+
+    def test_failed_batch_inserts_nothing(self):
+        task_id = str(uuid.uuid4())
+        details = [(task_id, {'input_json_path1': "a.json"}), (task_id, {'input_json_path1': "b.json"})]
+        db_logger.log_comparison_details_bulk(self.conn, details) # Duplicate key: the whole batch is rolled back
+        self.assertEqual(self.fetch("SELECT count(*) FROM task_details_comparison;"), [(0,)])
+
+
+    def test_large_batch_is_copied(self):
+        details = {
+            'input_text': "tab\there\nnew line \\N back\\slash",
+            'api_request_model': None,
+            'api_request_temperature': 0.25,
+            'api_request_stream': False,
+            'api_request_response_format': {"type": "json_object", "note": "a\tb\\c"},
+        }
+        task_ids = [str(uuid.uuid4()) for _ in range(3)]
+        with mock.patch.object(db_logger, "_COPY_THRESHOLD", 2), \
+             mock.patch.object(db_logger, "_copy_rows", wraps=db_logger._copy_rows) as copy_rows:
+            db_logger.log_ner_details_bulk(self.conn, [(task_id, details) for task_id in task_ids])
+        copy_rows.assert_called_once()
+        rows = self.fetch("""
+            SELECT input_text, api_request_model, api_request_temperature, api_request_stream,
+                   api_request_response_format, api_request_provider_options
+            FROM task_details_ner;
+        """)
+        self.assertEqual(len(rows), 3)
+        for row in rows:
+            self.assertEqual(row, (details['input_text'], None, 0.25, False, details['api_request_response_format'], None))
+
+
+
+class TestBeginOnServer(DatabaseTestCase):
+    def create_job(self):
+        with self.conn.cursor() as cur:
+            cur.execute("INSERT INTO jobs (job_id, status) VALUES (%s, 'pending') RETURNING job_id::text;", (str(uuid.uuid4()),))
+            job_id = cur.fetchone()[0]
+        self.conn.commit()
+        return job_id
+
+    def test_call_failing_before_send_keeps_the_block(self):
+        job_id = self.create_job()
+        with db_logger.begin(self.conn) as tx:
+            db_logger.update_job_status(tx, job_id, 'failed', Unadaptable()) # First statement of the block
+            db_logger.update_job_status(tx, job_id, 'in-progress')
+            db_logger.update_job_status(tx, job_id, 'completed', Unadaptable())
+        self.assertEqual(self.fetch("SELECT status FROM jobs;"), [('in-progress',)])
+
+    def test_server_error_rolls_back_only_its_call(self):
+        job_id = self.create_job()
+        with db_logger.begin(self.conn) as tx:
+            db_logger.update_job_status(tx, job_id, 'in-progress')
+            db_logger.update_job_status(tx, 'not-a-uuid', 'completed') # Rejected by the server
+        self.assertEqual(self.fetch("SELECT status FROM jobs;"), [('in-progress',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
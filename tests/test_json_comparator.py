@@ -9,7 +9,24 @@ import os.path
 
 # Adjust path to import from parent directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from json_comparator import compare_json_files, compare_category
+from json_comparator import compare_json_files, compare_category, run_json_comparison
+
+def _original_compare_category(list1, list2):
+    """compare_category as first written, kept as the reference for its results"""
+    result = {}
+    if not list1 and not list2:
+        return {"": "match"}
+    list1_lower = [str(item).lower() for item in list1]
+    list2_lower = [str(item).lower() for item in list2]
+    for item in list1 + list2:
+        item_str = str(item)
+        if item_str.lower() in list1_lower and item_str.lower() in list2_lower:
+            result[item_str] = "match"
+        elif item_str.lower() in list1_lower:
+            result[item_str] = "addition"
+        else:
+            result[item_str] = "omission"
+    return result
 
 class TestJsonComparator(unittest.TestCase):
     def test_category_comparison(self):
@@ -28,6 +45,45 @@ class TestJsonComparator(unittest.TestCase):
         # Test empty lists
         self.assertEqual(compare_category([], []), {"": "match"})
 
+    def test_category_matches_original_implementation(self):
+        # The fast paths (identical lists, one side empty, repeated items) must
+        # give the same entries, in the same order, as the original loop
+        cases = [
+            (["A", "B"], ["A", "B"]),      # identical
+            (["A", "a"], ["A", "a"]),      # identical, differently cased
+            (["A", "B"], []),              # additions only
+            ([], ["A", "B"]),              # omissions only
+            (["A", "A", "B"], ["b", "C", "C"]), # duplicates
+            (["A", "a", 1], ["1", "A", "x"]),   # case variants and non-strings
+        ]
+        for list1, list2 in cases:
+            with self.subTest(list1=list1, list2=list2):
+                self.assertEqual(
+                    list(compare_category(list1, list2).items()),
+                    list(_original_compare_category(list1, list2).items())
+                )
+
+    def test_entity_comparison(self):
+        ner1 = {"entities": [
+            {"entity_name": "DATE_OF_BIRTH", "entity_value": "1990", "confidence": 50},
+            {"entity_name": "DATE", "entity_value": "2024", "confidence": 50},
+            {"entity_name": "A_B", "entity_value": "C", "confidence": 90},
+        ]}
+        ner2 = {"entities": [
+            {"entity_name": "DATE", "entity_value": "2024", "confidence": 50},
+            {"entity_name": "A", "entity_value": "B_C", "confidence": 80},
+        ]}
+        result = run_json_comparison(ner1, ner2)["entities"]
+        # Sorted by name, then value: "DATE" comes before "DATE_OF_BIRTH", and
+        # ("A_B", "C") and ("A", "B_C") stay separate entities
+        self.assertEqual(
+            [(e["entity_name"], e["entity_value"], e["comparison"]) for e in result],
+            [("A", "B_C", "omission"), ("A_B", "C", "addition"),
+             ("DATE", "2024", "match"), ("DATE_OF_BIRTH", "1990", "addition")]
+        )
+        self.assertEqual(result[2]["confidence"], 75.0)
+        self.assertEqual(result[0]["confidence"], 80)
+
     def test_file_comparison(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             # Create test files
@@ -0,0 +1,55 @@
+"""Unit tests for the PDF text cache in the utilities module"""
+
+import importlib.util
+import unittest
+from unittest import mock
+import os
+import tempfile
+import time
+import sys
+import os.path
+
+# Adjust path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+HAVE_DEPENDENCIES = all(importlib.util.find_spec(name) is not None for name in ("requests", "PyPDF2"))
+if HAVE_DEPENDENCIES:
+    import utils
+
+URL = "https://example.com/report.pdf"
+
+@unittest.skipUnless(HAVE_DEPENDENCIES, "requests and PyPDF2 are not installed")
+class TestPdfTextCache(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        patcher = mock.patch.object(utils, "_PDF_CACHE_DIR", tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_key_is_per_url(self):
+        path = utils._pdf_cache_path(URL)
+        self.assertEqual(os.path.dirname(path), utils._PDF_CACHE_DIR)
+        self.assertEqual(path, utils._pdf_cache_path(URL))
+        self.assertNotEqual(path, utils._pdf_cache_path(URL + "?page=2"))
+
+    def test_round_trip(self):
+        self.assertIsNone(utils._pdf_cache_get(URL))
+        utils._pdf_cache_put(URL, "extracted text")
+        self.assertEqual(utils._pdf_cache_get(URL), "extracted text")
+
+    def test_expired_entry_is_a_miss(self):
+        utils._pdf_cache_put(URL, "extracted text")
+        expired = time.time() - utils._PDF_CACHE_TTL - 60
+        os.utime(utils._pdf_cache_path(URL), (expired, expired))
+        self.assertIsNone(utils._pdf_cache_get(URL))
+
+    def test_cached_text_skips_the_download(self):
+        utils._pdf_cache_put(URL, "extracted text")
+        with mock.patch.dict(os.environ, {"OPENROUTER_CACHE": "on"}), \
+             mock.patch.object(utils, "_download_pdf") as download:
+            self.assertEqual(utils.extract_text_from_pdf(URL), "extracted text")
+        download.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
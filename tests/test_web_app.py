@@ -0,0 +1,70 @@
+"""Unit tests for the web app's API endpoints (the database is replaced by mocks)"""
+
+import base64
+import hashlib
+import importlib.util
+import json
+import unittest
+from unittest import mock
+import os
+import tempfile
+import sys
+import os.path
+
+# Adjust path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+HAVE_DEPENDENCIES = all(importlib.util.find_spec(name) is not None for name in ("flask", "psycopg2", "dotenv"))
+if HAVE_DEPENDENCIES:
+    _UPLOADS = tempfile.TemporaryDirectory()
+    with mock.patch.dict(os.environ, {"UPLOAD_FOLDER": _UPLOADS.name}): # Created on import
+        import web_app
+
+
+IMAGE_BYTES = b"\x89PNG\r\n\x1a\n image data"
+
+
+@unittest.skipUnless(HAVE_DEPENDENCIES, "flask, psycopg2 or python-dotenv is not installed")
+class TestFileRefInput(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.image_path = os.path.join(tmpdir.name, "scan.png")
+        with open(self.image_path, 'wb') as f:
+            f.write(IMAGE_BYTES)
+        for name, value in (("connect_db", object()), ("close_db", None)):
+            patcher = mock.patch.object(web_app.db_logger, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = web_app.app.test_client()
+
+    def get_input(self, path, data=IMAGE_BYTES):
+        file_ref = json.dumps({"path": path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+        with mock.patch.object(web_app.db_logger, "get_vlm_input_content", return_value=("file_ref", file_ref)):
+            return self.client.get("/api/v1/tasks/task-1/input_content")
+
+    def test_unchanged_image_is_served(self):
+        response = self.get_input(self.image_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {
+            "task_id": "task-1",
+            "content_type": "image_base64",
+            "mime_type": "image/png",
+            "base64_data": base64.b64encode(IMAGE_BYTES).decode('ascii'),
+        })
+
+    def test_changed_image_is_refused(self):
+        response = self.get_input(self.image_path, data=b"what was logged")
+        self.assertEqual(response.status_code, 409)
+
+    def test_non_image_is_refused(self):
+        response = self.get_input(os.path.join(os.path.dirname(self.image_path), "db_config.ini"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_image(self):
+        response = self.get_input(os.path.join(os.path.dirname(self.image_path), "moved.png"))
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,11 +4,88 @@ Utilities
 Helper functions for the OpenRouter API client.
 """
 
+import atexit
+import functools
+import hashlib
 import os
+import sys
+import time
 import mimetypes
 import PyPDF2
 import requests
-from io import BytesIO
+import tempfile
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+# pypdfium2 is optional (pip install openrouter-client[fast]); when installed,
+# PDF text is extracted with the C PDFium library instead of pure-Python PyPDF2
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# Remote PDFs are streamed in chunks into a spooled temp file, which stays in
+# memory up to _PDF_SPOOL_MAX_SIZE and moves to disk beyond that
+_PDF_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+_PDF_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+_PDF_DOWNLOAD_TIMEOUT = (5, 60) # (connect, read) seconds
+
+# Shared session so fetching several PDFs from the same host reuses pooled
+# keep-alive connections instead of a fresh TCP+TLS handshake per file.
+_PDF_SESSION = requests.Session()
+_PDF_ADAPTER = HTTPAdapter(
+    pool_connections=16, # Number of distinct hosts to keep pools for
+    pool_maxsize=32,     # Connections kept per host
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False # Hand the final response to raise_for_status()
+    )
+)
+_PDF_SESSION.mount("https://", _PDF_ADAPTER)
+_PDF_SESSION.mount("http://", _PDF_ADAPTER)
+
+# Release the pooled keep-alive sockets cleanly when the interpreter exits
+atexit.register(_PDF_SESSION.close)
+
+# --- PDF Text Cache ---
+# Text of local PDFs is memoized per path, modification time and size. Text of
+# remote PDFs is kept on disk next to api_client's response cache, following the
+# same OPENROUTER_CACHE (on/off), OPENROUTER_CACHE_DIR and OPENROUTER_CACHE_TTL.
+
+_PDF_CACHE_DIR = os.path.join(os.path.expanduser(os.getenv("OPENROUTER_CACHE_DIR", "~/.cache/openrouter")), "pdf-text")
+_PDF_CACHE_TTL = float(os.getenv("OPENROUTER_CACHE_TTL", 7 * 24 * 3600))
+
+def _pdf_cache_enabled():
+    """Return True unless OPENROUTER_CACHE turns caching off."""
+    return os.getenv("OPENROUTER_CACHE", "on").lower() not in ("off", "0", "false", "no")
+
+def _pdf_cache_path(url):
+    """Path of the cached text for url, named by a hash of the URL."""
+    return os.path.join(_PDF_CACHE_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".txt")
+
+def _pdf_cache_get(url):
+    """Return the cached text for url, or None on miss/expiry."""
+    path = _pdf_cache_path(url)
+    try:
+        if time.time() - os.path.getmtime(path) > _PDF_CACHE_TTL:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+def _pdf_cache_put(url, text):
+    """Store the extracted text for url; failures are ignored."""
+    path = _pdf_cache_path(url)
+    try:
+        os.makedirs(_PDF_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path) # Atomic so concurrent readers never see a partial file
+    except OSError as e:
+        print(f"Warning: Could not write PDF text cache entry: {e}", file=sys.stderr)
 
 def determine_input_type(file_path):
     """
@@ -40,10 +117,128 @@ def determine_input_type(file_path):
     else:
         return "text"
 
+def _download_pdf(url):
+    """
+    Stream a remote PDF into a spooled temporary file
+    
+    The first bytes are checked for the %PDF signature before the rest is
+    downloaded, so an HTML error page fails fast instead of being fetched
+    in full and handed to the PDF parser.
+    
+    Args:
+        url (str): URL of the PDF
+        
+    Returns:
+        SpooledTemporaryFile: The PDF contents, positioned at the start
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=_PDF_SPOOL_MAX_SIZE)
+    try:
+        with _PDF_SESSION.get(url, stream=True, timeout=_PDF_DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            checked = False
+            for chunk in response.iter_content(chunk_size=_PDF_DOWNLOAD_CHUNK_SIZE):
+                spool.write(chunk)
+                # The header may follow a little leading junk, so look in the first KB
+                if not checked and spool.tell() >= 1024:
+                    _check_pdf_header(spool)
+                    checked = True
+            if not checked:
+                _check_pdf_header(spool)
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
+
+def _check_pdf_header(spool):
+    """Raise ValueError unless the first KB written to spool contains the %PDF signature"""
+    position = spool.tell()
+    spool.seek(0)
+    head = spool.read(1024)
+    spool.seek(position)
+    if b'%PDF' not in head:
+        raise ValueError("Downloaded content is not a PDF (missing %PDF header)")
+
+def _extract_text_pdfium(source):
+    """
+    Extract text from every page of a PDF with PDFium
+    
+    Args:
+        source (str or file): Path to the PDF, or a binary file object positioned at its start
+        
+    Returns:
+        str: Text of each page followed by a blank line
+    """
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page_texts = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            page_texts.append(textpage.get_text_range())
+            page_texts.append("\n\n")
+            textpage.close()
+            page.close()
+        return "".join(page_texts)
+    finally:
+        pdf.close()
+
+def _extract_text_pypdf2(pdf_file):
+    """
+    Extract text from every page of a PDF with PyPDF2
+    
+    Args:
+        pdf_file (file): Binary file object positioned at the start of the PDF
+        
+    Returns:
+        str: Text of each page followed by a blank line
+    """
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    
+    # Extract text from each page, joining once at the end rather than
+    # growing one string (and copying it) for every page. Pages are read
+    # one at a time: they share the reader's single file stream, so
+    # extracting them from several threads would interleave its seeks.
+    page_texts = []
+    for page in pdf_reader.pages:
+        page_texts.append(page.extract_text() or "") # Older PyPDF2 returns None for pages without text
+        page_texts.append("\n\n")
+    return "".join(page_texts)
+
+def _extract_text(pdf_file, source):
+    """
+    Extract the text of an open PDF, with PDFium when installed and PyPDF2 otherwise
+    
+    Args:
+        pdf_file (file): Binary file object positioned at the start of the PDF
+        source (str or file): What PDFium should open: the PDF's path, or pdf_file itself
+        
+    Returns:
+        str: Text of each page followed by a blank line
+    """
+    if pdfium is not None:
+        try:
+            return _extract_text_pdfium(source)
+        except Exception:
+            # PDFium rejects a few malformed files that PyPDF2 can still read
+            pdf_file.seek(0)
+    return _extract_text_pypdf2(pdf_file)
+
+@functools.lru_cache(maxsize=128)
+def _extract_local_text_cached(pdf_path, mtime_ns, size):
+    """
+    Extract a local PDF's text once per path, modification time and size.
+    """
+    with open(pdf_path, 'rb') as pdf_file:
+        # Local files are opened by PDFium itself
+        return _extract_text(pdf_file, pdf_path)
+
 def extract_text_from_pdf(pdf_path):
     """
     Extract text from a PDF file
     
+    Results are cached: in memory for local files until they change, and on
+    disk for URLs (see the PDF Text Cache settings above).
+    
     Args:
         pdf_path (str): Path to the PDF file or URL
         
@@ -53,27 +248,19 @@ def extract_text_from_pdf(pdf_path):
     try:
         # Handle remote PDFs
         if pdf_path.startswith(('http://', 'https://')):
-            response = requests.get(pdf_path)
-            response.raise_for_status()
-            pdf_file = BytesIO(response.content)
-        else:
-            # Handle local PDFs
-            pdf_file = open(pdf_path, 'rb')
+            use_cache = _pdf_cache_enabled()
+            text = _pdf_cache_get(pdf_path) if use_cache else None
+            if text is None:
+                with _download_pdf(pdf_path) as pdf_file:
+                    text = _extract_text(pdf_file, pdf_file)
+                if use_cache:
+                    _pdf_cache_put(pdf_path, text)
+            return text
         
-        # Extract text from PDF
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        
-        # Extract text from each page
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text += page.extract_text() + "\n\n"
-        
-        # Close the file if it's a local file
-        if not pdf_path.startswith(('http://', 'https://')):
-            pdf_file.close()
-            
-        return text
+        # Handle local PDFs
+        abs_path = os.path.abspath(pdf_path)
+        st = os.stat(abs_path)
+        return _extract_local_text_cached(abs_path, st.st_mtime_ns, st.st_size)
     except Exception as e:
         return f"Error extracting text from PDF: {str(e)}"
 
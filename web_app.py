@@ -5,14 +5,19 @@ Flask Web Application for LLM Comparison GUI
 from flask import Flask, render_template, request, jsonify, send_from_directory
 import os
 import sys
+import base64
+import hashlib
+import mimetypes
 import uuid
+import contextlib
 import threading # Using threading for simple background tasks initially
+from concurrent.futures import ThreadPoolExecutor # For running the two NER calls concurrently
 
 import db_logger
 import psycopg2
 import json # Import json at the top level
 from dotenv import load_dotenv # Import dotenv
-from config_handler import load_config
+from config_handler import load_config, get_api_request_details
 from utils import determine_input_type
 
 load_dotenv() # Load variables from .env file into environment
@@ -26,14 +31,36 @@ app.config['UPLOAD_FOLDER'] = os.path.abspath(upload_folder_path) # Ensure it's
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 # Limit upload size (e.g., 16MB)
 
 # Ensure upload folder exists
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # --- Background Task Management (Simple Example) ---
 # WARNING: This simple threading approach is not robust for production.
 # Consider Celery or Flask-Executor for better task management.
 active_jobs = {} # Dictionary to track background job threads {job_id: thread_object}
 
+@contextlib.contextmanager
+def _db_step(db_config_path):
+    """
+    One database step of a background workflow: a pooled connection is checked out
+    for just this block and its statements commit together. Workflows never hold a
+    connection while waiting on an LLM call, so long jobs can't exhaust the pool
+    that the status/output endpoints also draw from.
+    """
+    with db_logger.connection(db_config_path) as conn:
+        if conn is None:
+            raise Exception("Database connection failed")
+        with db_logger.begin(conn) as tx:
+            yield tx
+
+def _mark_failed(db_config_path, job_id, job_error, task_id=None, task_error=None):
+    """Records a failed job (and the task that failed, if any); database errors here are only reported."""
+    try:
+        with _db_step(db_config_path) as tx:
+            if task_id: db_logger.update_task_status(tx, task_id, 'failed', task_error)
+            db_logger.update_job_status(tx, job_id, 'failed', job_error)
+    except Exception as db_err:
+        print(f"Error: Could not record failure of job {job_id}: {db_err}", file=sys.stderr)
+
 def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config1_path, ner_config2_path, db_config_path):
     """The actual workflow logic run in a background thread."""
     print(f"Starting background workflow for job: {job_id}")
@@ -43,18 +70,11 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
     import json_comparator # Import within thread if needed
     import configparser # Import needed for temp config writing
 
-    # Connect to DB
-    conn = db_logger.connect_db(db_config_path)
-    if conn is None:
-        print(f"Error: Could not connect to database in background workflow for job {job_id}", file=sys.stderr)
-        return
-
     task1_id = None
     task2_id = None
     task3_id = None
     task4_id = None
     task5_id = None # Added for Task 5
-    temp_vlm_txt = None
     temp_review_config_path = None # Added for Task 5 cleanup
     vlm_response = None
     ner1_response = None
@@ -66,9 +86,7 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
 
     try: # Main workflow try block
         # Step 1: VLM Extraction
-        task1_id = db_logger.create_task(conn, job_id, 1, 'vlm_extraction')
-        if task1_id is None: raise Exception("Failed to create VLM task record.")
-        print(f"DEBUG: Entering VLM details logging for task {task1_id}")
+        vlm_details = None
         try:
             vlm_config_data = load_config(vlm_config_path)
             input_type = determine_input_type(input_file_path)
@@ -77,7 +95,6 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
             if input_type == 'image' and not input_file_path.startswith(('http://', 'https://')):
                 input_content_type = 'image_base64'
                 with open(input_file_path, 'rb') as f:
-                    import base64
                     input_content = base64.b64encode(f.read()).decode('utf-8')
             elif input_type == 'pdf' and not input_file_path.startswith(('http://', 'https://')):
                 input_content_type = 'pdf_base64'
@@ -88,98 +105,87 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
                     input_content = f.read()
             vlm_details = {
                 'input_source': input_file_path, 'input_content_type': input_content_type, 'input_content': input_content,
-                'api_request_model': vlm_config_data.get('MODEL'), 'api_request_system_prompt': vlm_config_data.get('SYSTEM_PROMPT'),
-                'api_request_user_prompt': vlm_config_data.get('USER_PROMPT'), 'api_request_temperature': float(vlm_config_data.get('TEMPERATURE', 0.7)),
-                'api_request_top_p': float(vlm_config_data.get('TOP_P', 1.0)), 'api_request_stream': vlm_config_data.get('STREAM', 'false').lower() == 'true',
-                'api_request_response_format': json.loads(vlm_config_data['RESPONSE_FORMAT']) if vlm_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': vlm_config_data.get('RESPONSE_FORMAT', 'text')},
-                'api_request_provider_options': json.loads(vlm_config_data['PROVIDER']) if vlm_config_data.get('PROVIDER', '').startswith('{') else None
+                **get_api_request_details(vlm_config_data)
             }
-            db_logger.log_vlm_details(conn, task1_id, vlm_details)
         except Exception as log_err:
-            print(f"Warning: Failed to log VLM input details for task {task1_id}: {log_err}", file=sys.stderr)
-        print(f"DEBUG: Finished VLM details logging for task {task1_id}")
-        db_logger.update_task_status(conn, task1_id, 'running')
+            print(f"Warning: Failed to prepare VLM input details for job {job_id}: {log_err}", file=sys.stderr)
+        # Create the task with its inputs in one statement and mark it running
+        with _db_step(db_config_path) as tx:
+            task1_id = db_logger.create_task_with_details(tx, job_id, 1, 'vlm_extraction', vlm_details)
+            if task1_id is not None: db_logger.update_task_status(tx, task1_id, 'running')
+        if task1_id is None: raise Exception("Failed to create VLM task record.")
         vlm_response = openrouter_client.run_openrouter_processing(input_file_path, vlm_config_path)
         if "error" in vlm_response:
             error_details = vlm_response["error"]; error_message_str = str(error_details) if error_details is not None else "Unknown VLM error"
-            db_logger.update_task_status(conn, task1_id, 'failed', error_message_str); db_logger.update_job_status(conn, job_id, 'failed', f"VLM step failed: {error_message_str}")
+            with _db_step(db_config_path) as tx:
+                db_logger.update_task_status(tx, task1_id, 'failed', error_message_str)
+                db_logger.update_job_status(tx, job_id, 'failed', f"VLM step failed: {error_message_str}")
             return
-        db_logger.update_task_details_output(conn, task1_id, 'vlm_extraction', {'output_text': vlm_response.get("choices", [{}])[0].get("message", {}).get("content", "")})
-        db_logger.update_task_status(conn, task1_id, 'completed')
+        with _db_step(db_config_path) as tx:
+            db_logger.update_task_details_output(tx, task1_id, 'vlm_extraction', {'output_text': vlm_response.get("choices", [{}])[0].get("message", {}).get("content", "")})
+            db_logger.update_task_status(tx, task1_id, 'completed')
 
-        # Step 2: NER 1
-        task2_id = db_logger.create_task(conn, job_id, 2, 'ner_processing')
-        if task2_id is None: raise Exception("Failed to create NER1 task record.")
+        # Steps 2 and 3: NER 1 and NER 2
+        # Both NER runs only need the VLM text, so their API calls run concurrently;
+        # all database writes stay on this thread
         vlm_text = vlm_response.get("choices", [{}])[0].get("message", {}).get("content", "")
+        ner1_details = None
         try:
             ner1_config_data = load_config(ner_config1_path)
             ner1_details = {
-                'input_text': vlm_text, 'api_request_model': ner1_config_data.get('MODEL'),
-                'api_request_system_prompt': ner1_config_data.get('SYSTEM_PROMPT'), 'api_request_user_prompt': ner1_config_data.get('USER_PROMPT'),
-                'api_request_temperature': float(ner1_config_data.get('TEMPERATURE', 0.7)), 'api_request_top_p': float(ner1_config_data.get('TOP_P', 1.0)),
-                'api_request_stream': ner1_config_data.get('STREAM', 'false').lower() == 'true',
-                'api_request_response_format': json.loads(ner1_config_data['RESPONSE_FORMAT']) if ner1_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': ner1_config_data.get('RESPONSE_FORMAT', 'text')},
-                'api_request_provider_options': json.loads(ner1_config_data['PROVIDER']) if ner1_config_data.get('PROVIDER', '').startswith('{') else None
+                'input_text': vlm_text, **get_api_request_details(ner1_config_data)
             }
-            db_logger.log_ner_details(conn, task2_id, ner1_details)
         except Exception as log_err:
-            print(f"Warning: Failed to log NER1 input details for task {task2_id}: {log_err}", file=sys.stderr)
-        db_logger.update_task_status(conn, task2_id, 'running')
-        temp_vlm_txt = input_file_path + ".vlm.txt"
-        with open(temp_vlm_txt, "w", encoding="utf-8") as f: f.write(vlm_text or "")
-        ner1_response = openrouter_client.run_openrouter_processing(temp_vlm_txt, ner_config1_path)
-        if "error" in ner1_response:
-            error_details = ner1_response["error"]; error_message_str = str(error_details) if error_details is not None else "Unknown NER1 error"
-            db_logger.update_task_status(conn, task2_id, 'failed', error_message_str); db_logger.update_job_status(conn, job_id, 'failed', f"NER1 step failed: {error_message_str}")
-            return
-        db_logger.update_task_details_output(conn, task2_id, 'ner_processing', {'output_json': ner1_response})
-        db_logger.update_task_status(conn, task2_id, 'completed')
-
-        # Step 3: NER 2
-        task3_id = db_logger.create_task(conn, job_id, 3, 'ner_processing')
-        if task3_id is None: raise Exception("Failed to create NER2 task record.")
+            print(f"Warning: Failed to prepare NER1 input details for job {job_id}: {log_err}", file=sys.stderr)
+        ner2_details = None
         try:
             print(f"DEBUG NER2: Attempting to load config: {ner_config2_path}")
             ner2_config_data = load_config(ner_config2_path)
             print(f"DEBUG NER2: Config loaded successfully.")
             print(f"DEBUG NER2: Preparing details dictionary...")
             ner2_details = {
-                'input_text': vlm_text, 'api_request_model': ner2_config_data.get('MODEL'),
-                'api_request_system_prompt': ner2_config_data.get('SYSTEM_PROMPT'), 'api_request_user_prompt': ner2_config_data.get('USER_PROMPT'),
-                'api_request_temperature': float(ner2_config_data.get('TEMPERATURE', 0.7)), 'api_request_top_p': float(ner2_config_data.get('TOP_P', 1.0)),
-                'api_request_stream': ner2_config_data.get('STREAM', 'false').lower() == 'true',
-                'api_request_response_format': json.loads(ner2_config_data['RESPONSE_FORMAT']) if ner2_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': ner2_config_data.get('RESPONSE_FORMAT', 'text')},
-                'api_request_provider_options': json.loads(ner2_config_data['PROVIDER']) if ner2_config_data.get('PROVIDER', '').startswith('{') else None
+                'input_text': vlm_text, **get_api_request_details(ner2_config_data)
             }
             print(f"DEBUG NER2: Details dictionary prepared.")
-            print(f"DEBUG NER2: Attempting to log details to DB...")
-            db_logger.log_ner_details(conn, task3_id, ner2_details)
-            print(f"DEBUG NER2: Details logged successfully.")
         except Exception as log_err:
-            print(f"Warning: Failed to log NER2 input details for task {task3_id}: {log_err}", file=sys.stderr)
-        db_logger.update_task_status(conn, task3_id, 'running')
-        print(f"DEBUG: About to call run_openrouter_processing for NER2 (Task {task3_id})")
-        print(f"DEBUG: NER2 Input File (temp_vlm_txt): {temp_vlm_txt}")
-        print(f"DEBUG: NER2 Config Path: {ner_config2_path}")
-        ner2_response = openrouter_client.run_openrouter_processing(temp_vlm_txt, ner_config2_path)
-        if "error" in ner2_response:
-            error_details = ner2_response["error"]; error_message_str = str(error_details) if error_details is not None else "Unknown NER2 error"
-            db_logger.update_task_status(conn, task3_id, 'failed', error_message_str); db_logger.update_job_status(conn, job_id, 'failed', f"NER2 step failed: {error_message_str}")
+            print(f"Warning: Failed to prepare NER2 input details for job {job_id}: {log_err}", file=sys.stderr)
+        with _db_step(db_config_path) as tx:
+            task2_id = db_logger.create_task_with_details(tx, job_id, 2, 'ner_processing', ner1_details)
+            if task2_id is not None: db_logger.update_task_status(tx, task2_id, 'running')
+            task3_id = db_logger.create_task_with_details(tx, job_id, 3, 'ner_processing', ner2_details)
+            if task3_id is not None: db_logger.update_task_status(tx, task3_id, 'running')
+        if task2_id is None: raise Exception("Failed to create NER1 task record.")
+        if task3_id is None: raise Exception("Failed to create NER2 task record.")
+        print(f"DEBUG: Running NER1 (Task {task2_id}) and NER2 (Task {task3_id}) concurrently")
+        # Hand the VLM text to both NER steps in memory instead of via a temp file
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ner1_future = executor.submit(openrouter_client.run_openrouter_text_processing, vlm_text or "", ner_config1_path)
+            ner2_future = executor.submit(openrouter_client.run_openrouter_text_processing, vlm_text or "", ner_config2_path)
+        ner1_response = ner1_future.result()
+        ner2_response = ner2_future.result()
+        ner_error_message = None
+        with _db_step(db_config_path) as tx:
+            for label, ner_task_id, ner_response in (("NER1", task2_id, ner1_response), ("NER2", task3_id, ner2_response)):
+                if "error" in ner_response:
+                    error_details = ner_response["error"]; error_message_str = str(error_details) if error_details is not None else f"Unknown {label} error"
+                    db_logger.update_task_status(tx, ner_task_id, 'failed', error_message_str)
+                    if ner_error_message is None: ner_error_message = f"{label} step failed: {error_message_str}"
+                else:
+                    db_logger.update_task_details_output(tx, ner_task_id, 'ner_processing', {'output_json': ner_response})
+                    db_logger.update_task_status(tx, ner_task_id, 'completed')
+            if ner_error_message is not None:
+                db_logger.update_job_status(tx, job_id, 'failed', ner_error_message)
+        if ner_error_message is not None:
             return
-        db_logger.update_task_details_output(conn, task3_id, 'ner_processing', {'output_json': ner2_response})
-        db_logger.update_task_status(conn, task3_id, 'completed')
 
         # Step 4: JSON Comparison
-        task4_id = db_logger.create_task(conn, job_id, 4, 'json_comparison')
-        if task4_id is None: raise Exception("Failed to create Comparison task record.")
         temp_ner1_json = input_file_path + ".ner1.json"
         temp_ner2_json = input_file_path + ".ner2.json"
-        try:
-            comparison_details = {'input_json_path1': temp_ner1_json, 'input_json_path2': temp_ner2_json}
-            db_logger.log_comparison_details(conn, task4_id, comparison_details)
-        except Exception as log_err:
-            print(f"Warning: Failed to log Comparison input details for task {task4_id}: {log_err}", file=sys.stderr)
-        db_logger.update_task_status(conn, task4_id, 'running')
+        comparison_details = {'input_json_path1': temp_ner1_json, 'input_json_path2': temp_ner2_json}
+        with _db_step(db_config_path) as tx:
+            task4_id = db_logger.create_task_with_details(tx, job_id, 4, 'json_comparison', comparison_details)
+            if task4_id is not None: db_logger.update_task_status(tx, task4_id, 'running')
+        if task4_id is None: raise Exception("Failed to create Comparison task record.")
 
         ner1_content = {}
         ner2_content = {}
@@ -198,8 +204,9 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
 
         try: # Main try for Comparison + Review steps
             comparison_result = json_comparator.run_json_comparison(ner1_content, ner2_content)
-            db_logger.update_task_details_output(conn, task4_id, 'json_comparison', {'output_comparison_json': comparison_result})
-            db_logger.update_task_status(conn, task4_id, 'completed')
+            with _db_step(db_config_path) as tx:
+                db_logger.update_task_details_output(tx, task4_id, 'json_comparison', {'output_comparison_json': comparison_result})
+                db_logger.update_task_status(tx, task4_id, 'completed')
 
             # --- Step 5: VLM Review (New Step) ---
             task5_id = None
@@ -214,7 +221,8 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
 
                 if not mismatched_entities:
                     print(f"No mismatched entities found for review in job {job_id}. Skipping VLM Review.")
-                    db_logger.update_job_status(conn, job_id, 'completed')
+                    with _db_step(db_config_path) as tx:
+                        db_logger.update_job_status(tx, job_id, 'completed')
                     return
 
                 mismatched_entities_dict = {"entities": mismatched_entities}
@@ -223,7 +231,8 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
                 mismatched_json_compact = json.dumps(mismatched_entities_dict, separators=(',', ':'))  # For config file
                 print(f"DEBUG: Mismatched entities for review:\n{mismatched_json_pretty}")
 
-                task5_id = db_logger.create_task(conn, job_id, 5, 'vlm_review')
+                with _db_step(db_config_path) as tx:
+                    task5_id = db_logger.create_task(tx, job_id, 5, 'vlm_review')
                 if task5_id is None: raise Exception("Failed to create VLM Review task record.")
 
                 print(f"DEBUG REVIEW: Attempting to load review config...")
@@ -242,21 +251,16 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
 
                 print(f"DEBUG REVIEW: Preparing review details dictionary...")
                 review_details = {
-                    'input_source': input_file_path, 'api_request_model': review_config_data.get('MODEL'),
-                    'api_request_system_prompt': review_config_data.get('SYSTEM_PROMPT'), 'api_request_user_prompt': modified_prompt,
-                    'api_request_temperature': float(review_config_data.get('TEMPERATURE', 0.7)), 'api_request_top_p': float(review_config_data.get('TOP_P', 1.0)),
-                    'api_request_stream': review_config_data.get('STREAM', 'false').lower() == 'true',
-                    'api_request_response_format': json.loads(review_config_data['RESPONSE_FORMAT']) if review_config_data.get('RESPONSE_FORMAT', '').startswith('{') else {'type': review_config_data.get('RESPONSE_FORMAT', 'text')},
-                    'api_request_provider_options': json.loads(review_config_data['PROVIDER']) if review_config_data.get('PROVIDER', '').startswith('{') else None
+                    'input_source': input_file_path,
+                    **get_api_request_details(review_config_data),
+                    'api_request_user_prompt': modified_prompt # Log the prompt actually sent
                 }
                 print(f"DEBUG REVIEW: Review details dictionary prepared.")
-                print(f"DEBUG REVIEW: Attempting to log review details to DB...")
-                db_logger.log_review_details(conn, task5_id, review_details)
-                print(f"DEBUG REVIEW: Review details logged successfully.")
-
-                print(f"DEBUG REVIEW: Attempting to update task status to 'running'...")
-                db_logger.update_task_status(conn, task5_id, 'running')
-                print(f"DEBUG REVIEW: Task status updated to 'running'.")
+                print(f"DEBUG REVIEW: Attempting to log review details and mark task 'running'...")
+                with _db_step(db_config_path) as tx:
+                    db_logger.log_review_details(tx, task5_id, review_details)
+                    db_logger.update_task_status(tx, task5_id, 'running')
+                print(f"DEBUG REVIEW: Review details logged and task status updated to 'running'.")
 
                 # --- Create temporary config file by replacing placeholder in original ---
                 temp_review_config_path = input_file_path + ".review_config.ini"
@@ -288,36 +292,29 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
                 if "error" in review_response:
                     error_details = review_response["error"]
                     error_message_str = str(error_details) if error_details is not None else "Unknown VLM Review error"
-                    db_logger.update_task_status(conn, task5_id, 'failed', error_message_str)
-                    db_logger.update_job_status(conn, job_id, 'failed', f"VLM Review step failed: {error_message_str}")
+                    _mark_failed(db_config_path, job_id, f"VLM Review step failed: {error_message_str}", task5_id, error_message_str)
                     return # Stop workflow
 
                 # Log successful output (Still inside the main try block for Task 5)
-                db_logger.update_task_details_output(conn, task5_id, 'vlm_review', {'output_review_json': review_response})
-                db_logger.update_task_status(conn, task5_id, 'completed')
+                with _db_step(db_config_path) as tx:
+                    db_logger.update_task_details_output(tx, task5_id, 'vlm_review', {'output_review_json': review_response})
+                    db_logger.update_task_status(tx, task5_id, 'completed')
                 print(f"Finished Step 5: VLM Review for job {job_id}")
 
             except Exception as review_err: # This except corresponds to the main try block for Task 5
                 print(f"ERROR: Exception caught during VLM Review step (Task 5): {type(review_err).__name__} - {review_err}", file=sys.stderr)
                 error_message_str = str(review_err) if review_err is not None else "Unknown VLM Review step error"
-                if task5_id:
-                    db_logger.update_task_status(conn, task5_id, 'failed', error_message_str)
-                db_logger.update_job_status(conn, job_id, 'failed', f"VLM Review step failed: {error_message_str}")
+                _mark_failed(db_config_path, job_id, f"VLM Review step failed: {error_message_str}", task5_id, error_message_str)
                 return # Stop workflow
 
             # Mark job as completed ONLY if VLM Review step also succeeded
-            db_logger.update_job_status(conn, job_id, 'completed')
+            with _db_step(db_config_path) as tx:
+                db_logger.update_job_status(tx, job_id, 'completed')
 
         except Exception as comp_err: # This except corresponds to the try block for Comparison (Task 4)
              print(f"Error during comparison logic or logging: {comp_err}", file=sys.stderr)
              error_message_str = str(comp_err) if comp_err is not None else "Unknown comparison error"
-             if task4_id: # Check if task4_id exists before updating
-                 db_logger.update_task_status(conn, task4_id, 'failed', error_message_str)
-             db_logger.update_job_status(conn, job_id, 'failed', f"Comparison step failed: {error_message_str}")
-             try:
-                 if temp_vlm_txt and os.path.exists(temp_vlm_txt): os.remove(temp_vlm_txt)
-             except OSError as e_clean:
-                 print(f"Warning: Could not remove temp VLM file during comparison error handling: {e_clean}", file=sys.stderr)
+             _mark_failed(db_config_path, job_id, f"Comparison step failed: {error_message_str}", task4_id, error_message_str)
              return # Stop workflow
 
         print(f"Finished background workflow for job: {job_id}")
@@ -326,18 +323,7 @@ def run_comparison_workflow(job_id, input_file_path, vlm_config_path, ner_config
         print(f"Error in background workflow for job {job_id}: {e}", file=sys.stderr)
         error_message_str = str(e) if e is not None else "Unknown workflow error"
         if job_id:
-            db_logger.update_job_status(conn, job_id, 'failed', error_message_str)
-    finally: # Corresponds to main workflow try
-        # Clean up intermediate files (VLM text) if they exist
-        # try: # Keep commented out
-        #     if temp_vlm_txt and os.path.exists(temp_vlm_txt): os.remove(temp_vlm_txt)
-        # except OSError as e_final_clean:
-        #      print(f"Warning: Could not remove temp file during final cleanup: {e_final_clean}", file=sys.stderr)
-        if temp_vlm_txt: # Only print if path was defined
-            print(f"DEBUG: Skipping removal of temp VLM file for debugging: {temp_vlm_txt}")
-        # Close database connection
-        if conn:
-            db_logger.close_db(conn)
+            _mark_failed(db_config_path, job_id, error_message_str)
 
 # --- Routes ---
 
@@ -359,7 +345,6 @@ def uploaded_file(filename):
         print(f"File not found for serving: {file_path}", file=sys.stderr)
         return "File not found", 404
     print(f"Serving uploaded file: {file_path}")
-    import mimetypes
     mime_type, _ = mimetypes.guess_type(file_path)
     absolute_upload_folder = app.config['UPLOAD_FOLDER']
     print(f"DEBUG: Serving file '{filename}' from directory '{absolute_upload_folder}'")
@@ -512,6 +497,22 @@ def get_task_input_content(task_id):
         if content_type == 'image_base64':
             mime_type = "image/jpeg"
             return jsonify({"task_id": task_id, "content_type": content_type, "mime_type": mime_type, "base64_data": content})
+        elif content_type == 'file_ref':
+            # compare_llms logs a reference ({"path", "size", "sha256"}) instead of the image
+            # itself; serve it only if it is still an image and unchanged since it was logged
+            file_ref = json.loads(content)
+            image_path = file_ref.get('path')
+            mime_type = mimetypes.guess_type(image_path)[0] if image_path else None
+            if not mime_type or not mime_type.startswith('image/'):
+                return jsonify({"error": f"Input of task {task_id} is not an image."}), 400
+            if not os.path.isfile(image_path):
+                return jsonify({"error": f"Input image for task {task_id} is no longer available on disk"}), 404
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            if hashlib.sha256(data).hexdigest() != file_ref.get('sha256'):
+                return jsonify({"error": f"Input image for task {task_id} has changed since it was logged"}), 409
+            return jsonify({"task_id": task_id, "content_type": "image_base64", "mime_type": mime_type,
+                            "base64_data": base64.b64encode(data).decode('ascii')})
         elif content_type == 'pdf_base64':
              return jsonify({"task_id": task_id, "content_type": content_type, "message": "PDF preview not directly supported via base64. Consider serving file."})
         elif content_type == 'url':
@@ -528,5 +529,6 @@ def get_task_input_content(task_id):
 
 # --- Main Execution ---
 if __name__ == '__main__':
+    db_logger.log_to_stderr()
     # TODO: Add command-line arguments for host, port, debug mode if needed
     app.run(debug=True, host='0.0.0.0', port=5001) # Run on port 5001 for example
\ No newline at end of file